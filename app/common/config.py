@@ -17,5 +17,67 @@ LOG_DIR.mkdir(parents=True, exist_ok=True)
 
 # 业务配置
 DEFAULT_FPS = 2  # 默认每秒抽2帧
+VIDEO_SAMPLING = "auto"  # 抽帧读取方式：auto / grab / seek / read（见 app/services/frame_extractor.py）
+VIDEO_DECODE_THREADS = 2  # 多个视频并行抽帧时每个视频的解码线程数（进程数 = CPU 核数 / 该值）
+FRAME_FORMAT = "jpg"  # 视频帧保存格式：jpg / png / webp
+FRAME_QUALITY = 90  # jpg / webp 编码质量（1-100）；png 为无损，忽略此项
+# 每个视频的帧编码线程数：0 为在解码线程中逐帧编码。编码线程与解码争用 CPU，只在空闲核较多时有收益，
+# 默认关闭；多核机器上先用 python -m benchmarks.bench_frame_encode 实测再调大
+FRAME_ENCODE_THREADS = 0
+VIDEO_SAMPLE_MODE = "fixed"  # 抽帧方式：fixed 按 fps 等间隔取帧；scene 按画面变化取帧（见 frame_extractor）
+SCENE_THRESHOLD = 12  # scene：与上一张保留帧的平均灰度差（0-255）达到该值视为画面变化
+SCENE_MIN_INTERVAL = 0.5  # scene：两帧之间至少间隔的秒数（画面剧烈变化时限制帧数）
+SCENE_MAX_INTERVAL = 10  # scene：画面一直不变时，最长间隔多少秒也保留一帧
+FRAME_DEDUP = False  # 抽帧时丢弃与最近保留帧几乎相同的帧（dHash，见 frame_extractor）
+FRAME_DEDUP_WINDOW = 8  # 与最近多少张保留帧比较
+FRAME_DEDUP_DISTANCE = 4  # dHash 汉明距离不超过该值视为相同
 SUPPORTED_VIDEO_EXT = ['.mp4', '.avi', '.mov', '.mkv']
-SUPPORTED_IMAGE_EXT = ['.jpg', '.jpeg', '.png', '.bmp']
\ No newline at end of file
+SUPPORTED_IMAGE_EXT = ['.jpg', '.jpeg', '.png', '.bmp']
+
+# 项目文件夹自动同步（FolderSyncService）
+FOLDER_SYNC_DEBOUNCE_MS = 1500       # 最后一次目录变化后等待多久再同步（合并连续写入）
+FOLDER_SYNC_MAX_DELAY_MS = 5000      # 持续有新文件写入时，最长多久也要同步一次
+FOLDER_SYNC_POLL_MS = 30000          # 兜底轮询间隔（网络盘等收不到文件系统通知的情况）
+FOLDER_SYNC_FALLBACK_POLL_MS = 5000  # 无法监听目录（目录过多 / 系统不支持）时的轮询间隔
+FOLDER_WATCH_MAX_DIRS = 1000         # 单个项目最多监听的目录数，超出后改为轮询
+
+# SQLite 性能配置：连接数据库时按顺序执行的 PRAGMA
+# - safe:     SQLite 默认行为（回滚日志 + 每次提交完整 fsync），最保守
+# - balanced: WAL 日志，读写互不阻塞；synchronous=NORMAL 在 WAL 下仅于检查点时 fsync
+# - fast:     在 balanced 基础上关闭 fsync、加大缓存，适合批量导入/可重建的数据
+# 可通过环境变量 YINTU_SQLITE_PROFILE 覆盖
+SQLITE_PROFILES = {
+    "safe": {
+        "journal_mode": "delete",
+        "synchronous": "full",
+        "cache_size": -2000,         # 负数单位为 KiB，约 2 MB
+        "mmap_size": 0,
+        "temp_store": "default",
+        "busy_timeout": 5000,        # 毫秒
+    },
+    "balanced": {
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "cache_size": -64000,        # 约 64 MB
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "memory",
+        "busy_timeout": 5000,
+    },
+    "fast": {
+        "journal_mode": "wal",
+        "synchronous": "off",
+        "cache_size": -256000,       # 约 256 MB
+        "mmap_size": 1024 * 1024 * 1024,
+        "temp_store": "memory",
+        "busy_timeout": 5000,
+    },
+}
+SQLITE_PROFILE = os.environ.get("YINTU_SQLITE_PROFILE", "balanced")
+
+
+def get_sqlite_pragmas(profile=None):
+    """返回指定配置的 PRAGMA 列表（保持顺序，journal_mode 需最先设置）"""
+    name = profile or SQLITE_PROFILE
+    if name not in SQLITE_PROFILES:
+        name = "balanced"
+    return list(SQLITE_PROFILES[name].items())
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""
+自定义 peewee 字段
+
+PointsField：多边形点集的紧凑二进制存储
+- 库中存 float32 小端序 [x0, y0, x1, y1, ...]，每个点 8 字节（JSON 文本约 40 字节/点）
+- 读出时直接得到 (N, 2) 的 NumPy 数组，无需逐点解析
+- 兼容旧数据：历史上以 JSON 文本 "[[0.1, 0.2], ...]" 存储的行照常解码
+"""
+
+import json
+
+import numpy as np
+from peewee import BlobField
+
+POINTS_DTYPE = np.dtype('<f4')
+
+
+def encode_points(points):
+    """点集 -> bytes；接受 (N, 2) 数组 / [[x, y], ...] / JSON 字符串，空点集返回 None"""
+    if points is None:
+        return None
+    if isinstance(points, (bytes, bytearray, memoryview)):
+        return bytes(points) or None
+    if isinstance(points, str):
+        points = json.loads(points)
+    arr = np.asarray(points, dtype=POINTS_DTYPE).reshape(-1, 2)
+    if not len(arr):
+        return None
+    return arr.tobytes()
+
+
+def decode_points(value):
+    """bytes / JSON 字符串 / 列表 -> (N, 2) float32 数组；空值返回 None"""
+    if value is None:
+        return None
+    if isinstance(value, np.ndarray):
+        return value.astype(POINTS_DTYPE, copy=False).reshape(-1, 2)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        if not len(value):
+            return None
+        return np.frombuffer(value, dtype=POINTS_DTYPE).reshape(-1, 2)
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=POINTS_DTYPE).reshape(-1, 2)
+
+
+class PointsField(BlobField):
+    """以 float32 二进制存储的点集字段（读写均为 NumPy 数组）"""
+
+    def db_value(self, value):
+        blob = encode_points(value)
+        return super().db_value(blob) if blob is not None else None
+
+    def python_value(self, value):
+        return decode_points(value)
@@ -0,0 +1,385 @@
+"""
+数据库结构迁移（yintu.db）
+
+- schemaversion 表记录已执行的迁移版本
+- init_db() 启动时调用 run_migrations()：旧库按版本号依次升级（原地、事务内执行），
+  新库直接按当前模型建表并标记为最新版本
+- 每个迁移都应当可重复执行（IF NOT EXISTS / 先检查列是否存在），
+  以便兼容「表已由 create_tables 建好但版本号未记录」的情况
+"""
+
+import time
+
+from app.common.logger import logger
+
+# [(version, description, func)]，按版本号升序
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """注册一个迁移：func(database) 在事务内执行"""
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+
+def latest_version():
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+
+def table_exists(database, table):
+    return table in database.get_tables()
+
+
+def column_exists(database, table, column):
+    return any(c.name == column for c in database.get_columns(table))
+
+
+def get_current_version(database):
+    if not table_exists(database, "schemaversion"):
+        return 0
+    row = database.execute_sql("SELECT MAX(version) FROM schemaversion").fetchone()
+    return int(row[0] or 0)
+
+
+def _stamp(database, version, description):
+    database.execute_sql(
+        "INSERT OR IGNORE INTO schemaversion (version, description, applied_at) "
+        "VALUES (?, ?, datetime('now', 'localtime'))",
+        (version, description))
+
+
+def run_migrations(database, models):
+    """把数据库升级到最新版本，返回 [(version, description, seconds)] 执行报告"""
+    from app.models.schema import SchemaVersion
+
+    report = []
+    fresh = not table_exists(database, "project")
+
+    if fresh:
+        with database.atomic():
+            database.create_tables(models)
+            for version, description, _ in MIGRATIONS:
+                _stamp(database, version, description)
+        logger.info(f"新建数据库，结构版本 v{latest_version()}")
+        return report
+
+    SchemaVersion.create_table(safe=True)
+    current = get_current_version(database)
+    pending = [m for m in MIGRATIONS if m[0] > current]
+
+    for version, description, func in pending:
+        start = time.perf_counter()
+        with database.atomic():
+            func(database)
+            _stamp(database, version, description)
+        cost = time.perf_counter() - start
+        report.append((version, description, cost))
+        logger.info(f"数据库迁移 v{version}（{description}）完成，耗时 {cost * 1000:.1f} ms")
+
+    # 补建迁移未覆盖的表/索引（均为 IF NOT EXISTS）
+    database.create_tables(models)
+
+    if report:
+        total = sum(r[2] for r in report)
+        logger.info(f"数据库已从 v{current} 升级到 v{latest_version()}，共 {len(report)} 个迁移，耗时 {total:.2f} s")
+    return report
+
+
+# =====================
+# 迁移定义
+# =====================
+
+@migration(1, "mediaitem 路径/标注状态索引")
+def _add_media_lookup_indexes(database):
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "mediaitem_file_path" ON "mediaitem" ("file_path")')
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "mediaitem_project_id_file_path" ON "mediaitem" ("project_id", "file_path")')
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "mediaitem_project_id_is_labeled_file_path" '
+        'ON "mediaitem" ("project_id", "is_labeled", "file_path")')
+    # 外键索引（旧版 peewee 建表时已创建，这里兜底）
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "annotation_media_item_id" ON "annotation" ("media_item_id")')
+    database.execute_sql("ANALYZE")
+
+
+@migration(2, "项目/类别计数器表")
+def _add_stats_tables(database):
+    from app.models.schema import ProjectStats
+
+    ProjectStats.create_table(safe=True)
+    # classstats 已在 v6 中由 label 表取代，这里按当时的结构建表
+    database.execute_sql(
+        'CREATE TABLE IF NOT EXISTS "classstats" ("id" INTEGER NOT NULL PRIMARY KEY, '
+        '"project_id" INTEGER NOT NULL, "label" VARCHAR(255) NOT NULL, "annotation_count" INTEGER NOT NULL, '
+        'FOREIGN KEY ("project_id") REFERENCES "project" ("id"))')
+    database.execute_sql(
+        'CREATE UNIQUE INDEX IF NOT EXISTS "classstats_project_id_label" ON "classstats" ("project_id", "label")')
+    database.execute_sql("DELETE FROM projectstats")
+    database.execute_sql("DELETE FROM classstats")
+    database.execute_sql(
+        "INSERT INTO projectstats (project_id, media_count, labeled_count, annotation_count) "
+        "SELECT p.id, "
+        "(SELECT COUNT(*) FROM mediaitem m WHERE m.project_id = p.id), "
+        "(SELECT COUNT(*) FROM mediaitem m WHERE m.project_id = p.id AND m.is_labeled = 1), "
+        "(SELECT COUNT(*) FROM annotation a JOIN mediaitem m ON a.media_item_id = m.id WHERE m.project_id = p.id) "
+        "FROM project p")
+    database.execute_sql(
+        "INSERT INTO classstats (project_id, label, annotation_count) "
+        "SELECT m.project_id, a.label, COUNT(*) FROM annotation a "
+        "JOIN mediaitem m ON a.media_item_id = m.id GROUP BY m.project_id, a.label")
+
+
+@migration(3, "多边形点集由 JSON 文本转为 float32 二进制")
+def _pack_polygon_points(database):
+    from app.models.fields import encode_points
+
+    # SQLite 列类型是弱约束，原 TEXT 列可直接存 BLOB，按批原地转换
+    last_id = 0
+    while True:
+        rows = database.execute_sql(
+            "SELECT id, points FROM annotation WHERE id > ? AND typeof(points) = 'text' ORDER BY id LIMIT 1000",
+            (last_id,)).fetchall()
+        if not rows:
+            break
+        updates = []
+        for ann_id, text in rows:
+            try:
+                blob = encode_points(text)
+            except (ValueError, TypeError):
+                blob = None
+            updates.append((blob, ann_id))
+        database.cursor().executemany("UPDATE annotation SET points = ? WHERE id = ?", updates)
+        last_id = rows[-1][0]
+
+
+@migration(4, "annotation 稳定标识 uid")
+def _add_annotation_uid(database):
+    if not column_exists(database, "annotation", "uid"):
+        database.execute_sql('ALTER TABLE "annotation" ADD COLUMN "uid" VARCHAR(255)')
+    database.execute_sql("UPDATE annotation SET uid = lower(hex(randomblob(16))) WHERE uid IS NULL")
+    database.execute_sql(
+        'CREATE UNIQUE INDEX IF NOT EXISTS "annotation_media_item_id_uid" ON "annotation" ("media_item_id", "uid")')
+
+
+@migration(5, "媒体路径拆分为目录表 + 文件名")
+def _intern_media_directories(database):
+    from playhouse.migrate import SqliteMigrator, migrate
+    from peewee import CharField, ForeignKeyField
+    from app.models.schema import Directory, split_media_path
+
+    Directory.create_table(safe=True)
+    if not column_exists(database, "mediaitem", "file_path"):
+        return
+
+    migrator = SqliteMigrator(database)
+    if not column_exists(database, "mediaitem", "directory_id"):
+        migrate(migrator.add_column(
+            "mediaitem", "directory_id", ForeignKeyField(Directory, field=Directory.id, null=True)))
+    if not column_exists(database, "mediaitem", "name"):
+        migrate(migrator.add_column("mediaitem", "name", CharField(null=True)))
+
+    # 按 id 分批回填：目录路径在 Python 侧拆分（与运行时 split_media_path 保持一致）
+    dir_ids = dict(database.execute_sql("SELECT path, id FROM directory").fetchall())
+    last_id = 0
+    while True:
+        rows = database.execute_sql(
+            "SELECT id, file_path FROM mediaitem WHERE id > ? ORDER BY id LIMIT 1000",
+            (last_id,)).fetchall()
+        if not rows:
+            break
+        updates = []
+        for media_id, file_path in rows:
+            dir_path, name = split_media_path(file_path or "")
+            dir_id = dir_ids.get(dir_path)
+            if dir_id is None:
+                dir_id = database.execute_sql(
+                    "INSERT INTO directory (path) VALUES (?)", (dir_path,)).lastrowid
+                dir_ids[dir_path] = dir_id
+            updates.append((dir_id, name, media_id))
+        database.cursor().executemany(
+            "UPDATE mediaitem SET directory_id = ?, name = ? WHERE id = ?", updates)
+        last_id = rows[-1][0]
+
+    # 旧的路径索引随列一起移除，并建立 (目录, 文件名) 索引
+    for index in ("mediaitem_file_path",
+                  "mediaitem_project_id_file_path",
+                  "mediaitem_project_id_is_labeled_file_path"):
+        database.execute_sql(f'DROP INDEX IF EXISTS "{index}"')
+    migrate(migrator.drop_column("mediaitem", "file_path"))
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "mediaitem_directory_id_name" ON "mediaitem" ("directory_id", "name")')
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "mediaitem_project_id_directory_id_name" '
+        'ON "mediaitem" ("project_id", "directory_id", "name")')
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "mediaitem_project_id_is_labeled_directory_id_name" '
+        'ON "mediaitem" ("project_id", "is_labeled", "directory_id", "name")')
+    database.execute_sql("ANALYZE")
+
+
+@migration(6, "类别表 label，标注改存 label_id")
+def _add_label_table(database):
+    from playhouse.migrate import SqliteMigrator, migrate
+    from peewee import ForeignKeyField
+    from app.models.schema import Label
+
+    Label.create_table(safe=True)
+    if not column_exists(database, "annotation", "label"):
+        return
+
+    # 1) 每个项目的类别：先按 Project.classes 中的顺序，再补上标注里出现过的其它类别
+    rows = []
+    has_classes = column_exists(database, "project", "classes")
+    projects = database.execute_sql(
+        "SELECT id, classes FROM project" if has_classes else "SELECT id, NULL FROM project").fetchall()
+    used = {}
+    for project_id, label in database.execute_sql(
+            "SELECT DISTINCT m.project_id, a.label FROM annotation a "
+            "JOIN mediaitem m ON a.media_item_id = m.id ORDER BY m.project_id, a.label"):
+        used.setdefault(project_id, []).append(label)
+    for project_id, classes in projects:
+        names = [c.strip() for c in (classes or "").split(",") if c.strip()]
+        for name in used.get(project_id, []):
+            if name not in names:
+                names.append(name)
+        rows.extend((project_id, name, order) for order, name in enumerate(dict.fromkeys(names)))
+    database.cursor().executemany(
+        "INSERT OR IGNORE INTO label (project_id, name, sort_order, annotation_count) VALUES (?, ?, ?, 0)", rows)
+
+    # 2) annotation.label（文本）-> label_id
+    migrator = SqliteMigrator(database)
+    if not column_exists(database, "annotation", "label_id"):
+        migrate(migrator.add_column(
+            "annotation", "label_id", ForeignKeyField(Label, field=Label.id, null=True)))
+    database.execute_sql(
+        "UPDATE annotation SET label_id = ("
+        "SELECT l.id FROM label l JOIN mediaitem m ON l.project_id = m.project_id "
+        "WHERE m.id = annotation.media_item_id AND l.name = annotation.label)")
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "annotation_label_id" ON "annotation" ("label_id")')
+    database.execute_sql(
+        "UPDATE label SET annotation_count = (SELECT COUNT(*) FROM annotation a WHERE a.label_id = label.id)")
+
+    # 3) 移除被取代的文本列与 classstats 表
+    migrate(migrator.drop_column("annotation", "label"))
+    if has_classes:
+        migrate(migrator.drop_column("project", "classes"))
+    database.execute_sql('DROP TABLE IF EXISTS "classstats"')
+
+
+@migration(7, "mediaitem (project, directory, name) 唯一索引")
+def _unique_media_per_project(database):
+    # 历史数据中可能有重复行（如同一视频重复抽帧入库）：保留 id 最小的一行，标注并入该行
+    dups = database.execute_sql(
+        "SELECT project_id, directory_id, name, MIN(id) FROM mediaitem "
+        "GROUP BY project_id, directory_id, name HAVING COUNT(*) > 1").fetchall()
+    for project_id, directory_id, name, keep_id in dups:
+        others = ("SELECT id FROM mediaitem WHERE project_id = ? AND directory_id = ? AND name = ? AND id <> ?")
+        params = (project_id, directory_id, name, keep_id)
+        database.execute_sql(f"UPDATE annotation SET media_item_id = ? WHERE media_item_id IN ({others})",
+                             (keep_id,) + params)
+        database.execute_sql(f"DELETE FROM mediaitem WHERE id IN ({others})", params)
+        database.execute_sql(
+            "UPDATE mediaitem SET is_labeled = EXISTS (SELECT 1 FROM annotation WHERE media_item_id = ?) "
+            "WHERE id = ?", (keep_id, keep_id))
+
+    # 受影响项目的图片计数器按实际数据修正
+    for project_id in {d[0] for d in dups}:
+        database.execute_sql(
+            "UPDATE projectstats SET "
+            "media_count = (SELECT COUNT(*) FROM mediaitem WHERE project_id = ?), "
+            "labeled_count = (SELECT COUNT(*) FROM mediaitem WHERE project_id = ? AND is_labeled = 1) "
+            "WHERE project_id = ?", (project_id, project_id, project_id))
+
+    database.execute_sql('DROP INDEX IF EXISTS "mediaitem_project_id_directory_id_name"')
+    database.execute_sql(
+        'CREATE UNIQUE INDEX "mediaitem_project_id_directory_id_name" '
+        'ON "mediaitem" ("project_id", "directory_id", "name")')
+
+
+@migration(8, "扫描清单：文件状态列 + 目录 mtime 表")
+def _add_scan_manifest(database):
+    from app.models.schema import ScanManifest
+
+    columns = (
+        ("file_size", "INTEGER"),
+        ("mtime", "REAL"),
+        ("inode", "INTEGER"),
+        ("is_missing", "INTEGER NOT NULL DEFAULT 0"),
+        ("needs_probe", "INTEGER NOT NULL DEFAULT 1"),
+    )
+    for name, ddl in columns:
+        if not column_exists(database, "mediaitem", name):
+            database.execute_sql(f'ALTER TABLE "mediaitem" ADD COLUMN "{name}" {ddl}')
+    # 旧行没有文件状态基线：首次重新扫描时按目录补齐，不视为「已修改」
+    ScanManifest.create_table(safe=True)
+
+
+@migration(9, "project 自动同步开关")
+def _add_project_auto_sync(database):
+    if not column_exists(database, "project", "auto_sync"):
+        database.execute_sql('ALTER TABLE "project" ADD COLUMN "auto_sync" INTEGER NOT NULL DEFAULT 0')
+
+
+@migration(10, "mediaitem 图片头信息列 + 待探测部分索引")
+def _add_image_info(database):
+    columns = (
+        ("width", "INTEGER"),
+        ("height", "INTEGER"),
+        ("image_format", "VARCHAR(255)"),
+        ("channels", "INTEGER"),
+    )
+    for name, ddl in columns:
+        if not column_exists(database, "mediaitem", name):
+            database.execute_sql(f'ALTER TABLE "mediaitem" ADD COLUMN "{name}" {ddl}')
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "mediaitem_pending_probe" ON "mediaitem" ("project_id", "id") '
+        'WHERE ("needs_probe" = 1)')
+
+
+@migration(11, "project 查重设置 + mediaitem 内容哈希列")
+def _add_content_hash(database):
+    for table, name, ddl in (
+        ("project", "dedup_mode", "VARCHAR(255) NOT NULL DEFAULT 'off'"),
+        ("project", "dedup_similar", "INTEGER NOT NULL DEFAULT 0"),
+        ("mediaitem", "content_hash", "VARCHAR(255)"),
+        ("mediaitem", "phash", "BIGINT"),
+        ("mediaitem", "duplicate_of_id", 'INTEGER REFERENCES "mediaitem" ("id")'),
+    ):
+        if not column_exists(database, table, name):
+            database.execute_sql(f'ALTER TABLE "{table}" ADD COLUMN "{name}" {ddl}')
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "mediaitem_project_id_content_hash" ON "mediaitem" ("project_id", "content_hash")')
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "mediaitem_duplicate_of_id" ON "mediaitem" ("duplicate_of_id")')
+
+
+@migration(12, "mediaitem 损坏图片校验列 + 浏览 / 待校验索引")
+def _add_image_validation(database):
+    for name, ddl in (
+        ("needs_validate", "INTEGER NOT NULL DEFAULT 1"),
+        ("is_broken", "INTEGER NOT NULL DEFAULT 0"),
+    ):
+        if not column_exists(database, "mediaitem", name):
+            database.execute_sql(f'ALTER TABLE "mediaitem" ADD COLUMN "{name}" {ddl}')
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "mediaitem_project_id_is_broken_directory_id_name" '
+        'ON "mediaitem" ("project_id", "is_broken", "directory_id", "name")')
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "mediaitem_pending_validate" ON "mediaitem" ("project_id", "id") '
+        'WHERE ("needs_validate" = 1)')
+
+
+@migration(13, "mediaitem 跳过的重复图片列，浏览索引加入该列")
+def _add_skipped_media(database):
+    if not column_exists(database, "mediaitem", "is_skipped"):
+        database.execute_sql('ALTER TABLE "mediaitem" ADD COLUMN "is_skipped" INTEGER NOT NULL DEFAULT 0')
+    database.execute_sql(
+        'CREATE INDEX IF NOT EXISTS "mediaitem_project_id_is_broken_is_skipped_directory_id_name" '
+        'ON "mediaitem" ("project_id", "is_broken", "is_skipped", "directory_id", "name")')
+    database.execute_sql('DROP INDEX IF EXISTS "mediaitem_project_id_is_broken_directory_id_name"')
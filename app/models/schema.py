@@ -1,8 +1,16 @@
 from peewee import *
-from app.common.config import DB_PATH
+from app.common.config import DB_PATH, get_sqlite_pragmas
+from app.models.fields import PointsField
 import datetime
+import os
+import threading
+import uuid
 
-db = SqliteDatabase(DB_PATH)
+db = SqliteDatabase(DB_PATH, pragmas=get_sqlite_pragmas())
+
+def new_uid():
+    """标注的稳定标识（界面创建图形时生成，跨多次保存保持不变）"""
+    return uuid.uuid4().hex
 
 class BaseModel(Model):
     class Meta:
@@ -13,19 +21,146 @@ class Project(BaseModel):
     path = CharField(unique=True)
     description = TextField(null=True)
     model_path = CharField(null=True)
-    classes = TextField(null=True) 
     created_at = DateTimeField(default=datetime.datetime.now)
+    auto_sync = BooleanField(default=False)  # 自动同步源文件夹中新增的文件
+    # 重复图片处理：off 不检测 / report 仅报告 / link 关联（同组共享标注）/ skip 跳过（保留记录，不参与浏览与计数）
+    dedup_mode = CharField(default='off')
+    dedup_similar = BooleanField(default=False)  # 额外计算感知哈希，报告相似（非完全相同）的图片
+
+class Label(BaseModel):
+    """项目内的类别：标注只存 label_id，类别改名只需更新这一行"""
+    project = ForeignKeyField(Project, backref='labels')
+    name = CharField()
+    sort_order = IntegerField(default=0)  # 项目内类别顺序（界面列表 / 颜色分配）
+    annotation_count = IntegerField(default=0)  # 该类别的标注数量（计数器，随标注写入维护）
+
+    class Meta:
+        indexes = (
+            (('project', 'name'), True),
+        )
+
+def normalize_dir(path):
+    """Directory 表中目录路径的统一写法（绝对路径、无末尾分隔符）"""
+    return os.path.normpath(os.path.abspath(path))
+
+def split_media_path(path):
+    """完整文件路径 -> (规范化的目录路径, 文件名)"""
+    return os.path.split(normalize_dir(path))
+
+class Directory(BaseModel):
+    """媒体文件所在目录：完整目录路径只存一份，MediaItem 只存目录 id + 文件名。
+    目录行各项目共用；源文件夹移动后按项目重定位（DataManager.relocate_project）。"""
+    path = CharField(unique=True)
+
+    # id <-> path 进程内缓存（目录数远少于文件数，常驻内存）
+    _id_to_path = {}
+    _path_to_id = {}
+    _cache_lock = threading.Lock()
+
+    @classmethod
+    def path_of(cls, dir_id):
+        path = cls._id_to_path.get(dir_id)
+        if path is None:
+            row = cls.get_or_none(cls.id == dir_id)
+            if row is None:
+                return None
+            path = cls._remember(row.id, row.path)
+        return path
+
+    @classmethod
+    def lookup(cls, dir_path):
+        """目录路径 -> id（不存在返回 None，不创建）"""
+        dir_id = cls._path_to_id.get(dir_path)
+        if dir_id is None:
+            row = cls.get_or_none(cls.path == dir_path)
+            if row is None:
+                return None
+            dir_id = row.id
+            cls._remember(dir_id, row.path)
+        return dir_id
+
+    @classmethod
+    def intern(cls, dir_path):
+        """目录路径 -> id（不存在则创建）"""
+        dir_id = cls.lookup(dir_path)
+        if dir_id is None:
+            cls.insert(path=dir_path).on_conflict_ignore().execute()
+            dir_id = cls.get(cls.path == dir_path).id
+            cls._remember(dir_id, dir_path)
+        return dir_id
+
+    @classmethod
+    def _remember(cls, dir_id, path):
+        with cls._cache_lock:
+            cls._id_to_path[dir_id] = path
+            cls._path_to_id[path] = dir_id
+        return path
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._cache_lock:
+            cls._id_to_path.clear()
+            cls._path_to_id.clear()
 
 class MediaItem(BaseModel):
     project = ForeignKeyField(Project, backref='media')
-    file_path = CharField()
+    directory = ForeignKeyField(Directory, backref='media')
+    name = CharField()  # 目录内的文件名
     media_type = CharField(default='image') 
     is_labeled = BooleanField(default=False)
     created_at = DateTimeField(default=datetime.datetime.now)
 
+    # 扫描清单：上次扫描时的文件状态，重新导入时据此判断新增 / 删除 / 修改
+    file_size = IntegerField(null=True)
+    mtime = FloatField(null=True)
+    inode = IntegerField(null=True)
+    is_missing = BooleanField(default=False)  # 文件已从磁盘消失（保留记录与标注，文件恢复后自动取消）
+    needs_probe = BooleanField(default=True)  # 新增或内容已变化，需要重新探测图片信息
+    needs_validate = BooleanField(default=True)  # 新增或内容已变化，需要重新完整解码校验
+    is_broken = BooleanField(default=False)  # 校验发现损坏 / 截断：不参与浏览、导出与项目计数
+
+    # 图片头信息（导入后由 image_probe 只读文件头得到），导出 / 标注界面不再打开文件取尺寸
+    width = IntegerField(null=True)
+    height = IntegerField(null=True)
+    image_format = CharField(null=True)  # jpeg / png / bmp ...
+    channels = IntegerField(null=True)
+
+    # 内容哈希（项目开启查重时与头信息一起计算）：blake2b 文件内容摘要 / 64 位 dHash（有符号存储）
+    content_hash = CharField(null=True)
+    phash = BigIntegerField(null=True)
+    duplicate_of = ForeignKeyField('self', null=True, backref='duplicates')  # 关联 / 跳过时指向同内容的首张图片
+    is_skipped = BooleanField(default=False)  # skip 模式跳过的重复图片：不参与浏览、导出与项目计数
+
+    class Meta:
+        indexes = (
+            # 按路径定位图片：(目录, 文件名)
+            (('directory', 'name'), False),
+            # 项目内按目录、文件名排序浏览；唯一约束保证重复导入时 ON CONFLICT IGNORE 去重
+            (('project', 'directory', 'name'), True),
+            # 项目进度统计 / 按顺序查找第一张未标注
+            (('project', 'is_labeled', 'directory', 'name'), False),
+            # 浏览顺序（排除损坏 / 跳过的图片）：定位 / 计数只扫描索引
+            (('project', 'is_broken', 'is_skipped', 'directory', 'name'), False),
+            # 项目内按内容哈希分组查重
+            (('project', 'content_hash'), False),
+        )
+
+    @property
+    def file_path(self):
+        """完整路径（目录路径来自 Directory 缓存，不会逐行查询）"""
+        return os.path.join(Directory.path_of(self.directory_id), self.name)
+
+# 待探测图片（部分索引：探测完成后的行不占索引空间）
+MediaItem.add_index(MediaItem.index(MediaItem.project, MediaItem.id, name="mediaitem_pending_probe")
+                    .where(MediaItem.needs_probe == True))
+
+# 待校验图片（部分索引，同上）
+MediaItem.add_index(MediaItem.index(MediaItem.project, MediaItem.id, name="mediaitem_pending_validate")
+                    .where(MediaItem.needs_validate == True))
+
 class Annotation(BaseModel):
     media_item = ForeignKeyField(MediaItem, backref='annotations')
-    label = CharField()
+    label = ForeignKeyField(Label, backref='annotations')
     
     # 矩形框数据 (归一化 cx, cy, w, h) - 即使是多边形也算一个包围盒存这里
     x = FloatField(default=0)
@@ -36,12 +171,50 @@ class Annotation(BaseModel):
     # 新增：形状类型 (rect / polygon)
     shape_type = CharField(default='rect') 
     
-    # 新增：多边形点集 (存 JSON 字符串: "[[0.1, 0.2], [0.3, 0.4]]")
-    points = TextField(null=True) 
+    # 多边形点集：float32 二进制（归一化坐标），读出为 (N, 2) NumPy 数组
+    points = PointsField(null=True)
     
     confidence = FloatField(default=1.0)
     created_at = DateTimeField(default=datetime.datetime.now)
 
+    # 稳定标识：按差异保存时用于匹配界面图形与数据库行
+    uid = CharField(default=new_uid)
+
+    class Meta:
+        indexes = (
+            (('media_item', 'uid'), True),
+        )
+
+class ProjectStats(BaseModel):
+    """项目计数器：由 DataManager 在写入的同一事务内维护，仪表盘直接读取"""
+    project = ForeignKeyField(Project, primary_key=True, backref='stats')
+    media_count = IntegerField(default=0)
+    labeled_count = IntegerField(default=0)
+    annotation_count = IntegerField(default=0)
+
+class ScanManifest(BaseModel):
+    """项目扫描清单（目录级）：上次扫描时各目录的 mtime。
+    目录内文件增删改名都会改变目录 mtime，mtime 未变的目录重新导入时不再列目录。"""
+    project = ForeignKeyField(Project, backref='scan_manifest')
+    directory = ForeignKeyField(Directory)
+    mtime = FloatField()
+
+    class Meta:
+        indexes = (
+            (('project', 'directory'), True),
+        )
+
+class SchemaVersion(BaseModel):
+    """数据库结构版本记录（每执行一次迁移写入一行）"""
+    version = IntegerField(unique=True)
+    description = CharField(null=True)
+    applied_at = DateTimeField(default=datetime.datetime.now)
+
+ALL_MODELS = [Project, Label, Directory, MediaItem, Annotation, ProjectStats, ScanManifest, SchemaVersion]
+
 def init_db():
-    db.connect()
-    db.create_tables([Project, MediaItem, Annotation])
\ No newline at end of file
+    from app.models.migrations import run_migrations
+
+    db.connect(reuse_if_open=True)
+    # 旧库先按版本迁移到当前结构，再补建缺失的表/索引；新库直接建表并记为最新版本
+    run_migrations(db, ALL_MODELS)
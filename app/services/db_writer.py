@@ -0,0 +1,200 @@
+"""
+后台数据库写线程
+
+所有写操作（保存标注、更新项目属性、导入/抽帧入库、删除项目）都提交到同一个写线程执行：
+- 写线程独占写连接，UI 线程只读（配合 WAL，读写互不阻塞），慢盘不会卡住画布
+- 队列中相邻的、key 相同的命令会被合并，只执行最后一条（如快速连续切图时同一张图的多次保存）
+- 一次取出的多条命令在同一个事务中提交（每条命令各自一个 savepoint，失败互不影响）
+- 命令内发布的数据变更事件会延迟到事务提交后再发出
+
+用法：
+    future = get_db_writer().submit(DataManager.save_annotations, media_id, boxes, key=("save", media_id))
+    get_db_writer().flush()   # 等待此前提交的所有写入完成（导出 / 退出前）
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from app.common.logger import logger
+from app.models.schema import db, Directory
+from app.services.event_bus import event_bus
+
+
+class _Command:
+    __slots__ = ("func", "args", "kwargs", "key", "future")
+
+    def __init__(self, func, args, kwargs, key):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.future = Future()
+
+
+class DbWriter(threading.Thread):
+    """单一数据库写线程（见模块说明）"""
+
+    def __init__(self, database=db, max_batch=64):
+        super().__init__(name="DbWriter", daemon=True)
+        self.database = database
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._pending = {}  # key -> 最近一次提交的 Future
+        self._lock = threading.Lock()
+        self._stopping = False
+
+        # 统计信息
+        self.executed = 0
+        self.coalesced = 0
+        self.transactions = 0
+
+    # === 提交接口 ===
+    def submit(self, func, *args, key=None, **kwargs) -> Future:
+        """提交写命令，返回 Future；key 相同的相邻命令会被合并为最后一条"""
+        if self._stopping:
+            raise RuntimeError("数据库写线程已停止")
+        cmd = _Command(func, args, kwargs, key)
+        if key is not None:
+            with self._lock:
+                self._pending[key] = cmd.future
+            cmd.future.add_done_callback(lambda f, k=key: self._forget(k, f))
+        self._queue.put(cmd)
+        return cmd.future
+
+    def call(self, func, *args, key=None, timeout=None, **kwargs):
+        """提交并等待结果（异常原样抛出）"""
+        return self.submit(func, *args, key=key, **kwargs).result(timeout)
+
+    def flush(self, timeout=None):
+        """等待此前提交的全部命令执行完毕"""
+        if threading.current_thread() is self:
+            return True
+        barrier = self.submit(lambda: None)
+        try:
+            barrier.result(timeout)
+            return True
+        except Exception:
+            return False
+
+    def wait_for(self, key, timeout=None):
+        """若 key 有尚未完成的写入，等待其完成（读之前保证能读到自己刚写的数据）"""
+        with self._lock:
+            future = self._pending.get(key)
+        if future is None or threading.current_thread() is self:
+            return
+        try:
+            future.result(timeout)
+        except Exception:
+            pass
+
+    def stop(self, timeout=None):
+        """处理完队列中剩余命令后退出线程"""
+        if self._stopping:
+            return
+        self.flush(timeout)
+        self._stopping = True
+        self._queue.put(None)
+        self.join(timeout)
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    # === 线程主循环 ===
+    def run(self):
+        self.database.connect(reuse_if_open=True)
+        try:
+            while True:
+                cmd = self._queue.get()
+                if cmd is None:
+                    break
+                batch = [cmd]
+                while len(batch) < self.max_batch:
+                    try:
+                        nxt = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if nxt is None:
+                        self._queue.put(None)
+                        break
+                    batch.append(nxt)
+                self._execute(self._coalesce(batch))
+        finally:
+            if not self.database.is_closed():
+                self.database.close()
+
+    def _coalesce(self, batch):
+        """合并相邻且 key 相同的命令：只保留最后一条，被合并命令的 Future 跟随其结果"""
+        groups = []
+        for cmd in batch:
+            if groups and cmd.key is not None and groups[-1][0].key == cmd.key:
+                groups[-1][1].append(groups[-1][0])
+                groups[-1][0] = cmd
+                self.coalesced += 1
+            else:
+                groups.append([cmd, []])
+        return groups
+
+    def _execute(self, groups):
+        start = time.perf_counter()
+        results = []
+        with event_bus.deferred() as events:
+            try:
+                with self.database.atomic():
+                    for cmd, _ in groups:
+                        mark = len(events)
+                        try:
+                            with self.database.atomic():
+                                results.append((True, cmd.func(*cmd.args, **cmd.kwargs)))
+                        except Exception as e:
+                            # 该命令的 savepoint 已回滚，丢弃它发布的事件
+                            del events[mark:]
+                            # 回滚的命令可能新建过目录，目录缓存作废
+                            Directory.clear_cache()
+                            logger.exception(f"数据库写入失败: {getattr(cmd.func, '__name__', cmd.func)}")
+                            results.append((False, e))
+            except Exception as e:
+                # 提交失败：整组回滚，事件全部丢弃
+                events.clear()
+                Directory.clear_cache()
+                logger.exception("数据库事务提交失败")
+                results = [(False, e)] * len(groups)
+
+        self.transactions += 1
+        self.executed += len(groups)
+        cost = time.perf_counter() - start
+        if cost > 0.5:
+            logger.info(f"写线程：{len(groups)} 条命令单事务提交耗时 {cost:.2f} s")
+
+        for (cmd, merged), (ok, value) in zip(groups, results):
+            for fut in [cmd.future] + [m.future for m in merged]:
+                if ok:
+                    fut.set_result(value)
+                else:
+                    fut.set_exception(value)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_db_writer() -> DbWriter:
+    """全局写线程（首次调用时启动）"""
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = DbWriter()
+            _writer.start()
+        return _writer
+
+
+def shutdown_db_writer(timeout=None):
+    """退出前调用：写完队列中剩余命令并停止写线程"""
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None and writer.is_alive():
+        writer.stop(timeout)
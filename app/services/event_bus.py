@@ -0,0 +1,55 @@
+"""
+数据变更事件总线
+
+DataManager 在写入提交后发布变更事件，界面（仪表盘 / 任务列表）订阅后只更新受影响的
+卡片或计数，不再在每次切换页面时全量重查、重建。
+
+所有信号只携带 id 与增量，订阅方按需通过 DataManager 读取最新数据。
+事件可能由后台写线程发出，订阅方应连接到 QObject 的方法（Qt 自动排队到其所在线程执行），
+不要直接连接 lambda。
+"""
+
+import threading
+from contextlib import contextmanager
+
+from PySide6.QtCore import QObject, Signal
+
+
+class DataEventBus(QObject):
+    project_created = Signal(int)            # project_id
+    project_updated = Signal(int)            # project_id（名称/模型/类别等属性变化）
+    project_deleted = Signal(int)            # project_id
+    media_added = Signal(int, int)           # project_id, 新增图片数（跳过重复 / 校验出损坏图片时为负数）
+    image_labeled = Signal(int, int, bool)   # project_id, media_id, True=变为已标注 / False=变为未标注
+    stats_rebuilt = Signal()                 # 计数器被整体重建，订阅方应全量刷新
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._local = threading.local()
+
+    def publish(self, event, *args):
+        """按事件名发布，例如 publish("media_added", project_id, 10)"""
+        pending = getattr(self._local, "pending", None)
+        if pending is not None:
+            pending.append((event, args))
+            return
+        getattr(self, event).emit(*args)
+
+    @contextmanager
+    def deferred(self):
+        """在当前线程暂存 publish 的事件，退出时统一发出（用于外层事务提交之后再通知）。
+
+        产出暂存列表，调用方可在回滚时清空/截断它以丢弃对应事件。
+        """
+        pending = []
+        self._local.pending = pending
+        try:
+            yield pending
+        finally:
+            self._local.pending = None
+            for event, args in pending:
+                getattr(self, event).emit(*args)
+
+
+# 全局单例
+event_bus = DataEventBus()
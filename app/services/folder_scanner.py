@@ -0,0 +1,123 @@
+"""
+媒体文件夹扫描
+
+基于 os.scandir 的流式扫描：子目录一经发现就提交给线程池并行列目录（NAS / 网络盘上列目录的延迟
+可以重叠），结果仍按「目录树先序、同级按名称排序」逐个目录产出，调用方可以边扫描边入库。
+
+增量扫描：传入上次扫描的目录清单 known_dirs 后，mtime 未变化的目录（没有新增/删除/改名的文件）
+不再列目录，直接沿用清单中的子目录继续向下，重新扫描的开销只与发生变化的目录有关。
+
+用法：
+    for d in scan_media_folder(root):
+        d.path, d.images, d.videos ...
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from app.common.config import SUPPORTED_IMAGE_EXT, SUPPORTED_VIDEO_EXT
+
+# 并行列目录的线程数（瓶颈是文件系统往返延迟而非 CPU）
+SCAN_WORKERS = 8
+
+
+@dataclass
+class ScannedDir:
+    """一个目录的扫描结果"""
+    path: str
+    mtime: float
+    unchanged: bool = False                      # True：目录 mtime 与清单一致，未列目录（images / videos 为空）
+    images: dict = field(default_factory=dict)   # 文件名 -> (size, mtime, inode)，按文件名排序
+    videos: list = field(default_factory=list)   # 视频完整路径
+
+
+def _classify(name):
+    ext = os.path.splitext(name)[1].lower()
+    if ext in SUPPORTED_IMAGE_EXT:
+        return "image"
+    if ext in SUPPORTED_VIDEO_EXT:
+        return "video"
+    return None
+
+
+def scan_media_folder(root, max_workers=SCAN_WORKERS, cancel_event=None, known_dirs=None):
+    """逐个目录产出 ScannedDir（目录树先序、同级按名称排序）。
+
+    - known_dirs：{目录路径: (mtime, [子目录路径])}，mtime 一致的目录跳过列目录
+    - 不跟随目录符号链接（与 os.walk 默认行为一致），不存在或无权限的目录跳过
+    - cancel_event（threading.Event）置位后尽快停止；提前结束迭代也会停止后台扫描
+    """
+    known_dirs = known_dirs or {}
+    stop = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="FolderScan")
+
+    def cancelled():
+        return stop.is_set() or (cancel_event is not None and cancel_event.is_set())
+
+    def submit_all(paths):
+        futures = []
+        for path in paths:
+            if cancelled():
+                break
+            try:
+                futures.append(pool.submit(scan_dir, path))
+            except RuntimeError:
+                # 线程池已关闭（扫描被提前结束）
+                break
+        return futures
+
+    def scan_dir(path):
+        if cancelled():
+            return None, []
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None, []
+
+        known = known_dirs.get(path)
+        if known is not None and known[0] == mtime:
+            return ScannedDir(path, mtime, unchanged=True), submit_all(known[1])
+
+        result = ScannedDir(path, mtime)
+        images, subdirs = [], []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                            continue
+                        if not entry.is_file():
+                            continue
+                        kind = _classify(entry.name)
+                        if kind == "image":
+                            st = entry.stat()
+                            images.append((entry.name, (st.st_size, st.st_mtime, entry.inode())))
+                        elif kind == "video":
+                            result.videos.append(entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+
+        # 子目录立即交给线程池，不等调用方处理完当前目录
+        children = submit_all(sorted(subdirs))
+        result.images = dict(sorted(images))
+        result.videos.sort()
+        return result, children
+
+    try:
+        stack = [pool.submit(scan_dir, root)]
+        while stack:
+            result, children = stack.pop().result()
+            if cancelled():
+                break
+            if result is None:
+                continue
+            yield result
+            stack.extend(reversed(children))
+    finally:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,202 @@
+"""
+项目文件夹自动同步
+
+对开启了自动同步（Project.auto_sync）的项目，监听其源文件夹，把新拷入的图片批量加入项目：
+- 用 QFileSystemWatcher 监听扫描清单中的每个目录（目录内文件增删时触发）
+- 连续的变化事件经防抖合并为一次同步；持续写入时最长 FOLDER_SYNC_MAX_DELAY_MS 也会同步一次
+- 同步本身是 DataManager.rescan_project（按扫描清单只列变化的目录）：在同步线程池中扫描，
+  改动按批交给写线程，扫描期间保存标注等写入不会排在整个扫描之后
+- 目录过多或无法监听时改为定时轮询；正常监听时也保留低频轮询兜底（网络盘可能收不到通知）
+- 同步加入或改动了图片时，后台探测其头信息（ProbeMediaWorker；开启查重的项目同时按查重模式处理）
+
+同步写入后由 DataManager 发布 media_added / project_updated 事件，界面按事件更新。
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PySide6.QtCore import QCoreApplication, QObject, QTimer, QFileSystemWatcher, Signal
+
+from app.common.config import (FOLDER_SYNC_DEBOUNCE_MS, FOLDER_SYNC_MAX_DELAY_MS, FOLDER_SYNC_POLL_MS,
+                               FOLDER_SYNC_FALLBACK_POLL_MS, FOLDER_WATCH_MAX_DIRS)
+from app.common.logger import logger
+from app.services.data_manager import DataManager
+from app.services.event_bus import event_bus
+from app.workers.probe_worker import ProbeMediaWorker
+
+# 扫描线程（各项目共用；NAS 上扫描主要在等待文件系统，少量线程即可）
+_sync_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="FolderSync")
+
+
+class ProjectFolderWatcher(QObject):
+    """单个项目的目录监听 + 防抖同步"""
+    synced = Signal(int, object)  # project_id, 同步汇总（rescan_project 的返回值，失败时为 None）
+    _sync_done = Signal(object)   # 同步线程回调 -> 本对象所在线程
+
+    def __init__(self, project_id, parent=None):
+        super().__init__(parent)
+        self.project_id = project_id
+        self._future = None
+        self._dirty = False        # 同步进行中又收到变化，完成后再同步一次
+        self._first_change = None  # 本轮防抖中第一次变化的时间
+        self._probe_worker = None
+        self._probe_again = False
+        self._cancel = threading.Event()  # 停止监听时中断进行中的扫描
+
+        self.fs_watcher = QFileSystemWatcher(self)
+        self.fs_watcher.directoryChanged.connect(self.on_directory_changed)
+
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(FOLDER_SYNC_DEBOUNCE_MS)
+        self.debounce_timer.timeout.connect(self.sync)
+
+        self.poll_timer = QTimer(self)
+        self.poll_timer.timeout.connect(self.sync)
+
+        self._sync_done.connect(self.on_sync_done)
+
+    def start(self):
+        # 启动时先同步一次：补上未运行期间的变化，并取得要监听的目录
+        self.sync()
+
+    def stop(self, wait=False):
+        """停止监听并中断进行中的扫描 / 探测。
+
+        wait=False（关闭自动同步、删除项目时在界面线程调用）不等待探测线程：进程池中的一批可能还要
+        一段时间才结束，线程改由应用对象持有，结束后自行释放。退出程序时 wait=True，等待其结束。
+        """
+        self._cancel.set()
+        self.debounce_timer.stop()
+        self.poll_timer.stop()
+        worker, self._probe_worker = self._probe_worker, None
+        if worker is not None:
+            worker.finished_signal.disconnect(self.on_probe_finished)
+            worker.stop()
+            if wait:
+                worker.wait()
+            else:
+                # 本对象随后 deleteLater，线程结束前不能随之销毁
+                worker.setParent(QCoreApplication.instance())
+                worker.finished.connect(worker.deleteLater)
+                if not worker.isRunning():
+                    worker.deleteLater()
+        paths = self.fs_watcher.directories()
+        if paths:
+            self.fs_watcher.removePaths(paths)
+
+    def on_directory_changed(self, path):
+        now = time.monotonic()
+        if self._first_change is None:
+            self._first_change = now
+        if (now - self._first_change) * 1000 >= FOLDER_SYNC_MAX_DELAY_MS:
+            self.sync()
+        else:
+            self.debounce_timer.start()  # 重新计时
+
+    def sync(self):
+        self.debounce_timer.stop()
+        self._first_change = None
+        if self._future is not None and not self._future.done():
+            self._dirty = True
+            return
+        self._dirty = False
+        self._future = _sync_pool.submit(DataManager.rescan_project, self.project_id, cancel_event=self._cancel)
+        self._future.add_done_callback(self._emit_done)
+
+    def _emit_done(self, future):
+        # 在同步线程中调用：经信号排队回到本对象所在线程；监听已停止、对象已销毁时忽略
+        try:
+            self._sync_done.emit(future)
+        except RuntimeError:
+            pass
+
+    def on_sync_done(self, future):
+        try:
+            summary = future.result()
+        except Exception:
+            logger.exception(f"项目 {self.project_id} 自动同步失败")
+            summary = None
+        if summary is not None:
+            self._update_watch(DataManager.get_scan_dirs(self.project_id))
+            if summary["added"] or summary["modified"] or summary["renamed"]:
+                self.start_probe()
+        self.synced.emit(self.project_id, summary)
+        if self._dirty:
+            self.sync()
+
+    def start_probe(self):
+        """新增 / 修改的图片读取头信息（后台线程；已在探测时，完成后再补一次）"""
+        if self._probe_worker is not None and self._probe_worker.isRunning():
+            self._probe_again = True
+            return
+        self._probe_again = False
+        self._probe_worker = ProbeMediaWorker(self.project_id)
+        self._probe_worker.finished_signal.connect(self.on_probe_finished)
+        self._probe_worker.start()
+
+    def on_probe_finished(self, project_id, count):
+        if self._probe_again:
+            self.start_probe()
+
+    def _update_watch(self, paths):
+        """监听目录与扫描清单保持一致；无法全部监听时改为较快的轮询"""
+        current = set(self.fs_watcher.directories())
+        wanted = set(paths) if len(paths) <= FOLDER_WATCH_MAX_DIRS else set()
+        if current - wanted:
+            self.fs_watcher.removePaths(list(current - wanted))
+        failed = self.fs_watcher.addPaths(sorted(wanted - current)) if wanted - current else []
+
+        fallback = len(paths) > FOLDER_WATCH_MAX_DIRS or bool(failed)
+        interval = FOLDER_SYNC_FALLBACK_POLL_MS if fallback else FOLDER_SYNC_POLL_MS
+        if self.poll_timer.interval() != interval or not self.poll_timer.isActive():
+            if fallback:
+                reason = (f"目录数 {len(paths)} 超过监听上限" if len(paths) > FOLDER_WATCH_MAX_DIRS
+                          else f"{len(failed)} 个目录无法监听")
+                logger.info(f"项目 {self.project_id}：{reason}，改为每 {interval / 1000:.0f} 秒轮询")
+            self.poll_timer.start(interval)
+
+
+class FolderSyncService(QObject):
+    """管理所有开启自动同步的项目（随 Project.auto_sync 的变化启停监听）"""
+    synced = Signal(int, object)  # project_id, 同步汇总
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.watchers = {}  # project_id -> ProjectFolderWatcher
+        event_bus.project_created.connect(self.on_project_changed)
+        event_bus.project_updated.connect(self.on_project_changed)
+        event_bus.project_deleted.connect(self.unwatch)
+        event_bus.stats_rebuilt.connect(self.start)
+
+    def start(self):
+        for p_data in DataManager.get_all_projects_stats():
+            if p_data['auto_sync']:
+                self.watch(p_data['id'])
+
+    def stop(self):
+        """退出程序时调用：停止全部监听并等待进行中的探测结束"""
+        for project_id in list(self.watchers):
+            self.unwatch(project_id, wait=True)
+
+    def on_project_changed(self, project_id):
+        p_data = DataManager.get_project_stats(project_id)
+        if p_data and p_data['auto_sync']:
+            self.watch(project_id)
+        else:
+            self.unwatch(project_id)
+
+    def watch(self, project_id):
+        if project_id in self.watchers:
+            return
+        watcher = ProjectFolderWatcher(project_id, self)
+        watcher.synced.connect(self.synced)
+        self.watchers[project_id] = watcher
+        watcher.start()
+
+    def unwatch(self, project_id, wait=False):
+        watcher = self.watchers.pop(project_id, None)
+        if watcher is not None:
+            watcher.stop(wait)
+            watcher.deleteLater()
@@ -0,0 +1,414 @@
+"""
+视频抽帧
+
+按目标帧率每 step 帧取一帧，提供三种读取方式：
+- read：逐帧 cap.read()，每帧都完整解码并转换颜色（原实现，作为对照）
+- grab：跳过的帧只 grab()（解码但不做颜色转换、不生成数组），要保留的帧才 retrieve()
+- seek：按帧号直接定位（CAP_PROP_POS_FRAMES），只解码从最近关键帧到目标帧的部分；
+  采样稀疏时远快于逐帧，但每次定位都有固定开销，且依赖容器索引与准确的总帧数
+
+auto 在采样间隔不小于 SEEK_MIN_STEP 且总帧数已知时选用 seek，否则用 grab。
+seek 定位失败（容器不支持随机访问）时，从当前位置起退回 grab。
+
+取哪些帧由 VIDEO_SAMPLE_MODE 决定：
+- fixed：按目标 fps 等间隔取帧
+- scene：按 SCENE_ANALYZE_FPS 取候选帧，缩成 SCENE_THUMB 大小的灰度图，与上一张保留帧逐像素求平均绝对差
+  （NumPy 向量化），达到 SCENE_THRESHOLD 才保留；两帧间隔不少于 SCENE_MIN_INTERVAL 秒，画面长时间不变时
+  每 SCENE_MAX_INTERVAL 秒也保留一帧。固定机位的视频帧数大幅减少，短暂的事件也不会被等间隔采样漏掉
+
+开启 FRAME_DEDUP 时，取到的帧在编码前再经一道去重：计算 64 位 dHash（image_hash.dhash_image），
+与最近 FRAME_DEDUP_WINDOW 张保留帧的汉明距离不超过 FRAME_DEDUP_DISTANCE 的丢弃（画面来回切换时
+窗口也能识别出重复），丢弃数记入清单的 "dropped"。
+
+每个视频的帧存放在 <输出根目录>/<指纹>/ 下（内容寻址，见 video_fingerprint），完成后写入
+manifest.json（源视频、帧号、时间戳、尺寸）；同一视频以相同参数再次导入时直接复用已有的帧。
+登记到项目时按清单插入（DataManager.add_frames），不再列目录。
+
+FRAME_ENCODE_THREADS > 0 时解码与编码流水线化（默认 0，逐帧编码）：当前线程只负责解码，取到的帧放入
+有界队列（ENCODE_QUEUE_SIZE，限制占用的内存），由编码线程压缩并写盘（cv2.imencode 会释放 GIL，可与解码并行）。
+保存格式与质量由 FRAME_FORMAT / FRAME_QUALITY 配置（jpg / png / webp），二者也计入帧目录指纹。
+
+多个视频由 VideoBatchExtractWorker 分发到进程池并行抽帧（每个进程一个视频，进程数按 CPU 核数与
+每个视频占用的解码线程数 VIDEO_DECODE_THREADS + 编码线程数 FRAME_ENCODE_THREADS 计算，见 video_pool_size）；
+子进程经队列回报进度。
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from app.common.config import (DEFAULT_FPS, VIDEO_SAMPLING, VIDEO_DECODE_THREADS, FRAME_FORMAT, FRAME_QUALITY,
+                               FRAME_ENCODE_THREADS, VIDEO_SAMPLE_MODE, SCENE_THRESHOLD, SCENE_MIN_INTERVAL,
+                               SCENE_MAX_INTERVAL, FRAME_DEDUP, FRAME_DEDUP_WINDOW, FRAME_DEDUP_DISTANCE)
+from app.services.image_hash import dhash_image, hamming
+
+SAMPLING_STRATEGIES = ("auto", "read", "grab", "seek")
+# 采样间隔（帧）不小于该值时 auto 选用 seek：两次定位之间要跳过的帧足够多，
+# 从关键帧解码到目标帧的代价才低于逐帧 grab（见 benchmarks/bench_frame_sampling.py）
+SEEK_MIN_STEP = 60
+
+SAMPLE_MODES = ("fixed", "scene")
+# scene 模式每秒分析的候选帧数（画面变化检测的时间精度）
+SCENE_ANALYZE_FPS = 5
+# scene 模式比较用的缩略图尺寸：足以反映画面内容变化，又对噪声与压缩失真不敏感
+SCENE_THUMB = (64, 36)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+# 视频指纹：大小 + 开头 / 中间 / 结尾各读取的字节数（完整读取数 GB 的视频代价太高）
+FINGERPRINT_SAMPLE = 1 << 20
+
+# 保存格式 -> (扩展名, MediaItem.image_format, 质量参数)
+FRAME_FORMATS = {
+    "jpg": (".jpg", "jpeg", cv2.IMWRITE_JPEG_QUALITY),
+    "png": (".png", "png", None),
+    "webp": (".webp", "webp", cv2.IMWRITE_WEBP_QUALITY),
+}
+# png 无损，质量不适用：用较低的压缩级别换取编码速度
+PNG_COMPRESSION = 1
+# 解码后等待编码的帧数上限（4K 帧约 25 MB 一帧）
+ENCODE_QUEUE_SIZE = 4
+
+
+def frame_step(source_fps, target_fps):
+    """每隔多少帧取一帧：例如原视频 30 帧/秒、目标 2 帧/秒，则每 15 帧取 1 帧"""
+    if not target_fps or target_fps <= 0 or not source_fps or source_fps <= 0:
+        return 30
+    return max(1, int(source_fps / target_fps))
+
+
+def choose_strategy(step, total_frames, strategy="auto"):
+    """auto 时按采样间隔与总帧数选择 read / grab / seek 之一"""
+    if strategy != "auto":
+        return strategy
+    if total_frames > 0 and step >= SEEK_MIN_STEP:
+        return "seek"
+    return "grab"
+
+
+def iter_frames(cap, step, strategy, total_frames=0, cancel_event=None):
+    """按 step 采样，逐个产出 (帧号, BGR 图像)；strategy 为 read / grab / seek"""
+    index = 0
+    if strategy == "seek":
+        while total_frames <= 0 or index < total_frames:
+            if cancel_event is not None and cancel_event.is_set():
+                return
+            if not cap.set(cv2.CAP_PROP_POS_FRAMES, index):
+                break  # 不支持随机访问：当前位置起逐帧 grab
+            ok, frame = cap.read()
+            if not ok:
+                return
+            yield index, frame
+            index += step
+        else:
+            return
+        strategy = "grab"
+        index = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+
+    while True:
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        if strategy == "read":
+            ok, frame = cap.read()
+            if not ok:
+                return
+            if index % step == 0:
+                yield index, frame
+        else:
+            if not cap.grab():
+                return
+            if index % step == 0:
+                ok, frame = cap.retrieve()
+                if not ok:
+                    return
+                yield index, frame
+        index += 1
+
+
+def scene_thumb(frame):
+    """BGR 帧 -> 用于比较的小尺寸灰度图（int16，便于直接相减）"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, SCENE_THUMB, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+def iter_scene_frames(candidates, threshold=SCENE_THRESHOLD, min_gap=1, max_gap=0):
+    """从候选帧 (帧号, 图像) 中挑出画面有变化的帧。
+
+    与上一张保留帧的缩略图平均绝对差 >= threshold 时保留；min_gap / max_gap 为帧号间隔的下限 / 上限
+    （max_gap 为 0 表示不限）。第一帧总是保留。
+    """
+    last_thumb = last_index = None
+    for index, frame in candidates:
+        thumb = scene_thumb(frame)
+        if last_thumb is not None:
+            gap = index - last_index
+            if gap < min_gap:
+                continue
+            if not (max_gap and gap >= max_gap) and np.abs(thumb - last_thumb).mean() < threshold:
+                continue
+        last_thumb, last_index = thumb, index
+        yield index, frame
+
+
+def drop_similar_frames(frames, window=FRAME_DEDUP_WINDOW, max_distance=FRAME_DEDUP_DISTANCE, stats=None):
+    """丢弃与最近 window 张保留帧 dHash 汉明距离 <= max_distance 的帧；丢弃数累加到 stats["dropped"]"""
+    recent = deque(maxlen=window)
+    for index, frame in frames:
+        value = dhash_image(frame)
+        if any(hamming(value, h) <= max_distance for h in recent):
+            if stats is not None:
+                stats["dropped"] = stats.get("dropped", 0) + 1
+            continue
+        recent.append(value)
+        yield index, frame
+
+
+def video_fingerprint(video_path, **params):
+    """视频内容 + 抽帧参数 -> 帧目录名（blake2b 十六进制）。内容相同、参数相同的视频得到同一目录"""
+    digest = hashlib.blake2b(digest_size=12)
+    size = os.path.getsize(video_path)
+    digest.update(str(size).encode())
+    with open(video_path, "rb") as f:
+        for offset in (0, size // 2, size - FINGERPRINT_SAMPLE):
+            f.seek(max(0, offset))
+            digest.update(f.read(FINGERPRINT_SAMPLE))
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def load_manifest(frame_dir):
+    """读取帧目录的清单；不存在（未抽取或未完成）或无法解析时返回 None"""
+    try:
+        with open(os.path.join(frame_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+
+def _write_manifest(frame_dir, manifest):
+    # 先写临时文件再替换：清单存在即代表帧目录完整
+    path = os.path.join(frame_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def encode_params(image_format, quality=FRAME_QUALITY):
+    """保存格式 -> cv2.imencode 的参数"""
+    flag = FRAME_FORMATS[image_format][2]
+    if flag is None:
+        return [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION]
+    return [flag, int(quality)]
+
+
+def _save_frame(path, frame, params=()):
+    # imencode + tofile：路径含中文时 cv2.imwrite 在 Windows 上会失败
+    ok, buf = cv2.imencode(os.path.splitext(path)[1], frame, params)
+    if ok:
+        buf.tofile(path)
+    return ok
+
+
+def report_frames(frames, on_frame):
+    """原样转发 (帧号, 图像)，每取到一帧先回调 on_frame(帧号)。
+
+    接在 iter_frames 之后、场景 / 去重过滤之前：进度按采样到的帧推进，不会因为帧被丢弃而停滞。
+    """
+    for index, frame in frames:
+        on_frame(index)
+        yield index, frame
+
+
+def save_frames(frames, frame_dir, ext=".jpg", params=(), encode_threads=FRAME_ENCODE_THREADS):
+    """保存 iter_frames 产出的 (帧号, 图像)，返回成功保存的帧号（升序）。
+
+    当前线程解码，经有界队列交给 encode_threads 个编码线程；encode_threads 为 0 时逐帧顺序编码。
+    编码线程中的异常在全部线程结束后重新抛出。
+    """
+    saved = []
+    if encode_threads <= 0:
+        for index, frame in frames:
+            if _save_frame(os.path.join(frame_dir, f"frame_{index:07d}{ext}"), frame, params):
+                saved.append(index)
+        return saved
+
+    tasks = queue.Queue(maxsize=ENCODE_QUEUE_SIZE)
+    errors = []
+
+    def encode():
+        while True:
+            item = tasks.get()
+            if item is None:
+                return
+            index, frame = item
+            try:
+                if _save_frame(os.path.join(frame_dir, f"frame_{index:07d}{ext}"), frame, params):
+                    saved.append(index)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=encode, daemon=True) for _ in range(encode_threads)]
+    for t in threads:
+        t.start()
+    try:
+        for index, frame in frames:
+            if errors:
+                break
+            tasks.put((index, frame))  # 队列满时阻塞：解码不会远远领先于编码
+    finally:
+        for _ in threads:
+            tasks.put(None)
+        for t in threads:
+            t.join()
+    if errors:
+        raise errors[0]
+    return sorted(saved)
+
+
+def extract_frames(video_path, output_root, fps=DEFAULT_FPS, strategy=VIDEO_SAMPLING, progress_cb=None,
+                   cancel_event=None, decode_threads=None, image_format=FRAME_FORMAT, quality=FRAME_QUALITY,
+                   encode_threads=FRAME_ENCODE_THREADS, mode=VIDEO_SAMPLE_MODE, dedup=FRAME_DEDUP):
+    """把视频按 fps 抽帧保存到 output_root/<指纹>/，返回清单（dict）；视频无法打开时返回 None。
+
+    清单：{"version", "dir", "source", "source_size", "source_fps", "fps", "width", "height",
+          "image_format", "quality", "mode", "scene", "dedup", "dropped", "complete",
+          "frames": [{"file", "index": 源视频帧号, "timestamp": 秒}, ...]}
+    - 已有完整清单时直接返回（"reused": True），不再解码
+    - 取消时返回 complete=False 的清单，且不写入清单文件（下次重新抽取）
+    - progress_cb(进度 0-100, 状态信息)：每采样到一帧回调一次（在场景 / 去重过滤之前，见 report_frames）
+    - decode_threads：FFmpeg 解码线程数（None 为 OpenCV 默认，即 CPU 核数）
+    - image_format / quality / encode_threads：保存格式、质量与编码线程数（见 save_frames）
+    - mode：fixed 按 fps 等间隔取帧；scene 按画面变化取帧（此时不使用 fps，参数记入清单的 "scene"）
+    - dedup：丢弃近似重复的帧（参数记入清单的 "dedup"，丢弃数为 "dropped"）
+    """
+    if image_format not in FRAME_FORMATS:
+        raise ValueError(f"不支持的帧格式：{image_format}")
+    if mode not in SAMPLE_MODES:
+        raise ValueError(f"不支持的抽帧方式：{mode}")
+    ext, format_name, _ = FRAME_FORMATS[image_format]
+    if image_format == "png":
+        quality = None  # 无损，质量不影响结果
+    scene = None
+    if mode == "scene":
+        scene = {"threshold": SCENE_THRESHOLD, "min_interval": SCENE_MIN_INTERVAL,
+                 "max_interval": SCENE_MAX_INTERVAL, "analyze_fps": SCENE_ANALYZE_FPS}
+        fps = None
+    if dedup:
+        dedup = {"window": FRAME_DEDUP_WINDOW, "max_distance": FRAME_DEDUP_DISTANCE}
+    else:
+        dedup = None
+    try:
+        frame_dir = os.path.join(output_root, video_fingerprint(video_path, fps=fps, format=image_format,
+                                                                quality=quality, scene=scene, dedup=dedup))
+    except OSError:
+        return None
+    manifest = load_manifest(frame_dir)
+    if manifest is not None:
+        manifest.update(dir=frame_dir, reused=True)
+        return manifest
+
+    if decode_threads:
+        cap = cv2.VideoCapture(video_path, cv2.CAP_ANY, [cv2.CAP_PROP_N_THREADS, decode_threads])
+    else:
+        cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return None
+    try:
+        source_fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        step = frame_step(source_fps, SCENE_ANALYZE_FPS if scene else fps)
+        strategy = choose_strategy(step, total_frames, strategy)
+        frames = iter_frames(cap, step, strategy, total_frames, cancel_event)
+        if progress_cb:
+            def on_frame(index):
+                progress = int(index / total_frames * 100) if total_frames > 0 else 0
+                progress_cb(min(progress, 100), f"正在抽帧: 第 {index} 帧")
+
+            frames = report_frames(frames, on_frame)
+        if scene:
+            rate = source_fps if source_fps > 0 else 30
+            frames = iter_scene_frames(frames, scene["threshold"], min_gap=max(1, round(scene["min_interval"] * rate)),
+                                       max_gap=round(scene["max_interval"] * rate))
+        stats = {"dropped": 0}
+        if dedup:
+            frames = drop_similar_frames(frames, dedup["window"], dedup["max_distance"], stats)
+
+        # 没有清单的目录是上次中断留下的，清空重来
+        shutil.rmtree(frame_dir, ignore_errors=True)
+        os.makedirs(frame_dir, exist_ok=True)
+        manifest = {
+            "version": MANIFEST_VERSION, "dir": frame_dir, "source": os.path.abspath(video_path),
+            "source_size": os.path.getsize(video_path), "source_fps": source_fps, "fps": fps,
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "image_format": format_name, "quality": quality, "mode": mode, "scene": scene,
+            "dedup": dedup, "dropped": 0, "complete": False, "frames": [],
+        }
+
+        saved = save_frames(frames, frame_dir, ext, encode_params(image_format, quality), encode_threads)
+        for index in saved:
+            timestamp = round(index / source_fps, 3) if source_fps > 0 else None
+            manifest["frames"].append({"file": f"frame_{index:07d}{ext}", "index": index, "timestamp": timestamp})
+        manifest["dropped"] = stats["dropped"]
+        if cancel_event is None or not cancel_event.is_set():
+            manifest["complete"] = True
+            _write_manifest(frame_dir, manifest)
+        return manifest
+    finally:
+        cap.release()
+
+
+# === 多视频并行抽帧（进程池） ===
+def video_pool_size(video_count, cpu_count=None):
+    """(进程数, 每个进程的解码线程数)：每个视频占 VIDEO_DECODE_THREADS 个解码核 + FRAME_ENCODE_THREADS 个编码核，
+    核数不足时至少一个进程；分到的核扣除编码线程后都给解码，至少一个"""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    processes = max(1, min(video_count, cpu_count // (max(1, VIDEO_DECODE_THREADS) + FRAME_ENCODE_THREADS)))
+    return processes, max(1, cpu_count // processes - FRAME_ENCODE_THREADS)
+
+
+_progress_queue = None
+_cancel_event = None
+
+
+def _init_pool(progress_queue, cancel_event):
+    # 子进程初始化：进度队列与取消标志只能在创建进程时传入
+    global _progress_queue, _cancel_event
+    _progress_queue = progress_queue
+    _cancel_event = cancel_event
+
+
+def _extract_job(index, video_path, output_root, fps, strategy, decode_threads):
+    """子进程中抽取一个视频，进度以 (index, 进度, 状态信息) 放入队列；返回清单（无法打开为 None）"""
+    last = [-1]
+
+    def on_progress(progress, text):
+        if progress != last[0]:  # 每个百分点回报一次，避免队列拥塞
+            last[0] = progress
+            _progress_queue.put((index, progress, text))
+
+    return extract_frames(video_path, output_root, fps=fps, strategy=strategy, progress_cb=on_progress,
+                          cancel_event=_cancel_event, decode_threads=decode_threads)
+
+
+def create_video_pool(processes):
+    """创建抽帧进程池，返回 (pool, 进度队列, 取消标志)"""
+    ctx = multiprocessing.get_context("spawn")
+    progress_queue = ctx.Queue()
+    cancel_event = ctx.Event()
+    pool = ProcessPoolExecutor(max_workers=processes, mp_context=ctx,
+                               initializer=_init_pool, initargs=(progress_queue, cancel_event))
+    return pool, progress_queue, cancel_event
+
+
+def submit_video(pool, index, video_path, output_root, fps=DEFAULT_FPS, strategy=VIDEO_SAMPLING, decode_threads=None):
+    return pool.submit(_extract_job, index, video_path, output_root, fps, strategy, decode_threads)
@@ -0,0 +1,125 @@
+"""
+图片内容哈希与查重
+
+- 内容哈希：blake2b（16 字节摘要）按 HASH_CHUNK 分块流式读取整个文件，字节完全相同的文件哈希相同
+- 感知哈希：64 位差值哈希 dHash（缩小为 9×8 灰度，比较左右相邻像素），重新编码 / 缩放后仍相近，
+  以汉明距离 <= PHASH_MAX_DISTANCE 视为相似
+
+probe_pending_media 对每张图片调用 analyze_file：每个文件只读一遍，同时得到头信息与内容哈希
+（不论是否开启查重，之后切换查重模式无需重新探测），项目开启感知哈希时再算 dHash。
+dHash 需要解码图片，是 CPU 密集的，此时改用进程池；子进程以 spawn 方式启动（主进程已有 Qt 与写线程，
+fork 不安全）。
+"""
+
+import hashlib
+import io
+import os
+import struct
+
+import cv2
+import numpy as np
+
+from app.services.image_probe import probe_stream, probe_image
+
+# 内容哈希每次读取的字节数
+HASH_CHUNK = 1 << 20
+# 哈希进程数
+HASH_WORKERS = max(2, min(8, os.cpu_count() or 2))
+# 每个子进程任务包含的文件数（减少进程间往返）
+HASH_CHUNKSIZE = 16
+# dHash 汉明距离不超过该值视为相似图片
+PHASH_MAX_DISTANCE = 4
+
+_MASK64 = (1 << 64) - 1
+
+
+def dhash(data):
+    """图片文件内容 -> 64 位 dHash（转为有符号整数以便存入 SQLite）；无法解码返回 None"""
+    # 按 1/4 尺寸解码（JPEG 直接在 DCT 阶段缩小），后面只需要 9×8 的缩略图
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if img is None or img.size == 0:
+        return None
+    return dhash_image(img)
+
+
+def dhash_image(img):
+    """已解码的图像（灰度或 BGR 数组）-> 64 位 dHash（有符号整数）"""
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(img, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = int.from_bytes(np.packbits(bits).tobytes(), "big")
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def hamming(a, b):
+    return bin((a ^ b) & _MASK64).count("1")
+
+
+def analyze_file(path, with_phash=False):
+    """读取一遍文件，返回 (ImageInfo | None, 内容哈希 | None, dHash | None)；文件无法读取时全部为 None。
+    （线程池或进程池中调用，须为模块级函数）"""
+    digest = hashlib.blake2b(digest_size=16)
+    chunks = []
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(HASH_CHUNK)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                # 头信息只需第一块；dHash 需要完整内容
+                if with_phash or not chunks:
+                    chunks.append(chunk)
+    except OSError:
+        return None, None, None
+
+    info = None
+    if chunks:
+        try:
+            info = probe_stream(io.BytesIO(chunks[0]))
+        except struct.error:
+            info = None
+    if info is None:
+        # 帧头不在第一块内或非常见格式：按原方式再探测一次
+        info = probe_image(path)
+    phash = dhash(b"".join(chunks)) if with_phash and chunks else None
+    return info, digest.hexdigest(), phash
+
+
+def group_similar(items, max_distance=PHASH_MAX_DISTANCE):
+    """按 dHash 把图片分组：[(media_id, phash)] -> [[media_id, ...], ...]（只返回 2 张及以上的组）。
+
+    64 位哈希切成 max_distance + 1 段：距离不超过 max_distance 的两个哈希至少有一段完全相同，
+    只比较有相同段的候选，再验证汉明距离；相似关系按并查集传递合并。
+    """
+    parent = {}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    bands = max_distance + 1
+    bounds = [64 * i // bands for i in range(bands + 1)]
+    buckets = {}
+    for media_id, phash in items:
+        parent[media_id] = media_id
+        value = phash & _MASK64
+        for i in range(bands):
+            key = (i, (value >> bounds[i]) & ((1 << (bounds[i + 1] - bounds[i])) - 1))
+            buckets.setdefault(key, []).append((media_id, phash))
+
+    for candidates in buckets.values():
+        if len(candidates) < 2:
+            continue
+        for i, (a, ha) in enumerate(candidates):
+            for b, hb in candidates[i + 1:]:
+                if find(a) != find(b) and hamming(ha, hb) <= max_distance:
+                    parent[find(b)] = find(a)
+
+    groups = {}
+    for media_id, _ in items:
+        groups.setdefault(find(media_id), []).append(media_id)
+    return [sorted(g) for g in groups.values() if len(g) > 1]
@@ -0,0 +1,191 @@
+"""
+图片头信息探测
+
+只读文件头，不解码像素：JPEG 逐段跳到 SOF、PNG 读 IHDR、BMP 读 DIB 头，其它格式退回
+QImageReader（同样只读头）。宽高为文件中存储的原始尺寸（不应用 EXIF 方向），与界面
+QPixmap / QImageReader.size() 的结果一致。
+
+导入或同步后，probe_pending_media 在线程池中并行探测项目内 needs_probe 的图片，
+结果经写线程批量写回 MediaItem（width / height / image_format / channels）。
+同一遍读取中一并计算内容哈希（见 image_hash），之后开启查重无需重新探测；
+项目开启感知哈希时改为进程池（dHash 需要解码图片）。
+"""
+
+import multiprocessing
+import os
+import struct
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+
+from PySide6.QtGui import QImageReader
+
+ImageInfo = namedtuple("ImageInfo", ["width", "height", "format", "channels"])
+
+# 并行探测的线程数（瓶颈是磁盘 / 网络盘的读取延迟）
+PROBE_WORKERS = 8
+# 每批从数据库取出、探测并写回的图片数
+PROBE_BATCH_SIZE = 500
+
+# JPEG 中携带图像尺寸的 SOF 段（C4 / C8 / CC 是 DHT / JPG / DAC，不是帧头）
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# PNG 颜色类型 -> 通道数
+_PNG_CHANNELS = {0: 1, 2: 3, 3: 3, 4: 2, 6: 4}
+
+
+def _probe_jpeg(f):
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            continue
+        marker = f.read(1)
+        while marker == b"\xff":  # 填充字节
+            marker = f.read(1)
+        if not marker:
+            return None
+        m = marker[0]
+        if m == 0x01 or 0xD0 <= m <= 0xD8:
+            continue  # 无长度字段的标记
+        if m in (0xD9, 0xDA):
+            return None  # 到达图像数据仍未遇到帧头
+        header = f.read(2)
+        if len(header) < 2:
+            return None
+        length = struct.unpack(">H", header)[0]
+        if m in _JPEG_SOF:
+            data = f.read(6)
+            if len(data) < 6:
+                return None
+            _, height, width, components = struct.unpack(">BHHB", data)
+            return ImageInfo(width, height, "jpeg", components)
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def _probe_png(f):
+    f.seek(8)
+    data = f.read(18)
+    if len(data) < 18 or data[4:8] != b"IHDR":
+        return None
+    width, height, _, color_type = struct.unpack(">IIBB", data[8:18])
+    return ImageInfo(width, height, "png", _PNG_CHANNELS.get(color_type))
+
+
+def _probe_bmp(f):
+    f.seek(14)
+    data = f.read(16)
+    if len(data) < 4:
+        return None
+    header_size = struct.unpack("<I", data[:4])[0]
+    if header_size == 12:  # BITMAPCOREHEADER
+        width, height, _, bpp = struct.unpack("<HHHH", data[4:12])
+    elif len(data) >= 16:
+        width, height, _, bpp = struct.unpack("<iiHH", data[4:16])
+    else:
+        return None
+    # 调色板图像按 RGB 计
+    return ImageInfo(abs(width), abs(height), "bmp", 4 if bpp == 32 else 3)
+
+
+def _probe_qt(path):
+    reader = QImageReader(path)
+    size = reader.size()
+    if not size.isValid():
+        return None
+    name = reader.imageFormat().name
+    if "Grayscale" in name or name in ("Format_Alpha8", "Format_Mono", "Format_MonoLSB"):
+        channels = 1
+    elif "Invalid" in name:
+        channels = None
+    elif "ARGB" in name or "RGBA" in name or name.startswith("Format_A2"):
+        channels = 4
+    else:
+        channels = 3
+    return ImageInfo(size.width(), size.height(), bytes(reader.format()).decode() or None, channels)
+
+
+def probe_stream(f):
+    """从已打开的二进制文件对象（或 BytesIO）解析头信息；不是 JPEG / PNG / BMP 或头部不完整时返回 None"""
+    head = f.read(8)
+    if head[:2] == b"\xff\xd8":
+        info = _probe_jpeg(f)
+    elif head == b"\x89PNG\r\n\x1a\n":
+        info = _probe_png(f)
+    elif head[:2] == b"BM":
+        info = _probe_bmp(f)
+    else:
+        info = None
+    if info is None or info.width <= 0 or info.height <= 0:
+        return None
+    return info
+
+
+def probe_image(path):
+    """读取图片头，返回 ImageInfo；无法识别或读取失败返回 None"""
+    try:
+        with open(path, "rb") as f:
+            info = probe_stream(f)
+    except (OSError, struct.error):
+        return None
+    if info is None:
+        # 头部损坏或非常见变体：交给 Qt 的图片插件再试一次
+        return _probe_qt(path)
+    return info
+
+
+def probe_images(paths, max_workers=PROBE_WORKERS):
+    """并行探测多张图片，结果与 paths 一一对应"""
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ImageProbe") as pool:
+        return list(pool.map(probe_image, paths))
+
+
+def probe_pending_media(project_or_id, progress_cb=None, cancel_event=None, max_workers=PROBE_WORKERS):
+    """探测项目中所有 needs_probe 的图片并写回数据库，返回本次探测的图片数。
+
+    - 读取、探测与内容哈希（analyze_file）在线程池中进行，写回提交给后台写线程（不阻塞写线程读文件）
+    - 项目开启感知哈希时改用进程池；写回时按项目的查重模式关联 / 跳过重复图片
+    - progress_cb(已探测数, 待探测总数)：每批回调一次
+    - cancel_event 置位后在批次之间停止；未探测的图片保持 needs_probe，下次继续
+    """
+    from app.services.data_manager import DataManager
+    from app.services.db_writer import get_db_writer
+    from app.services.image_hash import analyze_file, HASH_WORKERS, HASH_CHUNKSIZE
+
+    project_id = getattr(project_or_id, "id", project_or_id)
+    writer = get_db_writer()
+    total = DataManager.count_pending_probe(project_id)
+    if not total:
+        return 0
+    dedup_mode, with_phash = DataManager.get_dedup_settings(project_id)
+    with_phash = with_phash and dedup_mode != 'off'
+    if with_phash:
+        pool = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        work, chunksize = partial(analyze_file, with_phash=True), HASH_CHUNKSIZE
+    else:
+        # 只算内容哈希：blake2b 与文件读取都会释放 GIL，线程池即可
+        pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ImageProbe")
+        work, chunksize = analyze_file, 1
+
+    done = 0
+    last_id = 0
+    future = None
+    with pool:
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            batch = DataManager.get_probe_batch(project_id, after_id=last_id, limit=PROBE_BATCH_SIZE)
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            outputs = pool.map(work, [path for _, path in batch], chunksize=chunksize)
+            results = [(media_id, *output) for (media_id, _), output in zip(batch, outputs)]
+            future = writer.submit(DataManager.save_probe_results, results,
+                                   project_id=project_id, dedup_mode=dedup_mode)
+            done += len(batch)
+            if progress_cb:
+                progress_cb(done, max(total, done))
+    if future is not None:
+        future.result()
+    return done
@@ -0,0 +1,93 @@
+"""
+损坏 / 截断图片校验
+
+导入时只读了文件头，文件是否能完整解码要到标注员翻到它时才知道。validate_pending_media 在
+进程池中用 cv2 完整解码项目内 needs_validate 的图片：
+
+- 解码失败视为损坏
+- JPEG 缺少结束标记 EOI、PNG 缺少 IEND 块视为截断（libjpeg 对截断文件会补灰继续解码，
+  cv2 仍返回图像，只在 stderr 打印警告，必须单独检查）；IEND 之后的附加数据（常见于部分编辑器、
+  拼接水印的文件）不影响解码，不算损坏
+
+结果经写线程写回 MediaItem.is_broken；损坏的图片不参与浏览、导出与项目计数。
+按 id 分批进行，取消后未校验的图片保持 needs_validate，下次继续。
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+# 校验进程数（完整解码是 CPU 密集的）
+VALIDATE_WORKERS = max(2, min(8, os.cpu_count() or 2))
+# 每批从数据库取出、校验并写回的图片数
+VALIDATE_BATCH_SIZE = 200
+# 每个子进程任务包含的文件数
+VALIDATE_CHUNKSIZE = 8
+
+
+# PNG 结束块：长度 0 + 类型 IEND + 固定的 CRC，整段比对不会与压缩数据中偶然出现的 "IEND" 混淆
+_PNG_IEND = b"\x00\x00\x00\x00IEND\xaeB`\x82"
+
+
+def _jpeg_truncated(data):
+    # 缩略图（EXIF）自带一对 SOI / EOI，位于主图像数据之前：最后一个扫描段（SOS）之后必须还有 EOI
+    return data.rfind(b"\xff\xd9") < data.rfind(b"\xff\xda")
+
+
+def validate_image(path):
+    """完整解码一张图片：True 正常 / False 损坏或截断 / None 文件无法读取（可能正被移动，下次再校验）。
+    （进程池中调用，须为模块级函数）"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if not data:
+        return False
+    if data[:2] == b"\xff\xd8" and _jpeg_truncated(data):
+        return False
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and data.rfind(_PNG_IEND) == -1:
+        return False
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+    return img is not None and img.size > 0
+
+
+def validate_pending_media(project_or_id, progress_cb=None, cancel_event=None, max_workers=VALIDATE_WORKERS):
+    """校验项目中所有 needs_validate 的图片，返回 {"checked", "broken", "seconds", "rate"}。
+
+    - progress_cb(已校验数, 待校验总数, 图片/秒)：每批回调一次
+    - cancel_event 置位后在批次之间停止；未校验的图片下次继续
+    """
+    from app.services.data_manager import DataManager
+    from app.services.db_writer import get_db_writer
+
+    project_id = getattr(project_or_id, "id", project_or_id)
+    writer = get_db_writer()
+    start = time.perf_counter()
+    total = DataManager.count_pending_validate(project_id)
+    done = 0
+    last_id = 0
+    futures = []
+    if total:
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                batch = DataManager.get_validate_batch(project_id, after_id=last_id, limit=VALIDATE_BATCH_SIZE)
+                if not batch:
+                    break
+                last_id = batch[-1][0]
+                oks = pool.map(validate_image, [path for _, path in batch], chunksize=VALIDATE_CHUNKSIZE)
+                futures.append(writer.submit(DataManager.save_validation_results, project_id,
+                                             [(media_id, ok) for (media_id, _), ok in zip(batch, oks)]))
+                done += len(batch)
+                if progress_cb:
+                    cost = time.perf_counter() - start
+                    progress_cb(done, max(total, done), done / cost if cost > 0 else 0.0)
+    broken = sum(f.result()[1] for f in futures)
+    seconds = time.perf_counter() - start
+    return {"checked": done, "broken": broken, "seconds": seconds, "rate": done / seconds if seconds > 0 else 0.0}
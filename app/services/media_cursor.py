@@ -0,0 +1,98 @@
+"""
+项目图片浏览游标
+
+标注界面按 (directory_id, name, id) 顺序浏览项目图片，只在内存中保留当前位置所在的一页：
+- 顺序翻页（上一张 / 下一张）越过页边界时，以当前页首/尾的键取相邻一页（键集分页）
+- 跳转到任意序号 / 指定图片时重新定位一页：从开头、末尾或当前页中最近的一处沿索引数过去
+  （见 DataManager.get_media_at），代价与跳转距离成正比
+打开百万级项目也只需读取一页，与项目规模无关。
+"""
+
+from app.services.data_manager import DataManager, MEDIA_PAGE_SIZE
+
+
+class MediaCursor:
+    def __init__(self, project_or_id, page_size=MEDIA_PAGE_SIZE):
+        self.project_id = getattr(project_or_id, "id", project_or_id)
+        self.page_size = page_size
+        self.index = -1
+        self._window = []  # 当前页 MediaItem（仅 id / directory / name / is_labeled）
+        self._start = 0    # 当前页第一张的序号
+        self.refresh_total()
+
+    def __len__(self):
+        return self.total
+
+    def refresh_total(self):
+        """图片总数取自项目计数器（不做 COUNT 扫描）"""
+        stats = DataManager.get_project_stats(self.project_id)
+        self.total = stats['total'] if stats else 0
+        return self.total
+
+    def reload(self):
+        """项目图片有增减后（如自动同步加入新图片）重新定位：更新总数，重新读取当前图片的序号与所在页"""
+        media = self.current()
+        self.refresh_total()
+        if media is None:
+            self._window, self._start, self.index = [], 0, -1
+            return
+        self.seek_media(media)
+
+    def current(self):
+        if self._start <= self.index < self._start + len(self._window):
+            return self._window[self.index - self._start]
+        return None
+
+    def seek(self, index):
+        """定位到第 index 张（从 0 开始），返回该图片；越界或图片已不存在时返回 None"""
+        if not 0 <= index < self.total:
+            return None
+        end = self._start + len(self._window)
+        if not self._start <= index < end:
+            if self._window and index == end:
+                page = DataManager.get_media_page(
+                    self.project_id, after=DataManager.media_key(self._window[-1]), limit=self.page_size)
+                start = end
+            elif self._window and index == self._start - 1:
+                page = DataManager.get_media_page(
+                    self.project_id, before=DataManager.media_key(self._window[0]), limit=self.page_size)
+                start = self._start - len(page)
+            else:
+                # 以当前页首为已知位置：跳转代价与跳转距离（而不是序号）成正比
+                known = (self._start, DataManager.media_key(self._window[0])) if self._window else None
+                anchor = DataManager.get_media_at(self.project_id, index, anchor=known, total=self.total)
+                page = self._page_from(anchor)
+                start = index
+            if not page:
+                return None
+            self._window, self._start = page, start
+        self.index = index
+        return self._window[index - self._start]
+
+    def seek_media(self, media):
+        """定位到指定图片（MediaItem），返回其序号"""
+        index = DataManager.get_media_index(media)
+        self._window, self._start = self._page_from(media), index
+        self.index = index
+        return index
+
+    def seek_first_unlabeled(self):
+        """定位到第一张未标注的图片；全部已标注时定位到第一张"""
+        media = DataManager.get_first_unlabeled(self.project_id)
+        if media is None:
+            return self.seek(0)
+        self.seek_media(media)
+        return self.current()
+
+    def next(self):
+        return self.seek(self.index + 1) if self.index >= 0 else None
+
+    def prev(self):
+        return self.seek(self.index - 1) if self.index > 0 else None
+
+    def _page_from(self, anchor):
+        if anchor is None:
+            return []
+        rest = DataManager.get_media_page(
+            self.project_id, after=DataManager.media_key(anchor), limit=self.page_size - 1)
+        return [anchor] + rest
@@ -1,4 +1,4 @@
-from PySide6.QtWidgets import QLayout, QSizePolicy
+from PySide6.QtWidgets import QLayout, QSizePolicy, QWidgetItem
 from PySide6.QtCore import Qt, QRect, QSize, QPoint
 
 class FlowLayout(QLayout):
@@ -20,6 +20,12 @@ class FlowLayout(QLayout):
     def addItem(self, item):
         self.itemList.append(item)
 
+    def insertWidget(self, index, widget):
+        """在指定位置插入控件（addWidget 只能追加到末尾）"""
+        self.addChildWidget(widget)
+        self.itemList.insert(max(0, index), QWidgetItem(widget))
+        self.invalidate()
+
     def count(self):
         return len(self.itemList)
 
@@ -11,10 +11,14 @@ from app.ui.views.home_interface import HomeInterface
 from app.ui.views.label_interface import LabelInterface
 from app.ui.views.task_list_interface import TaskListInterface
 from app.services.data_manager import DataManager
-from app.workers.video_worker import VideoExtractWorker
+from app.services.db_writer import get_db_writer, shutdown_db_writer
+from app.services.media_cursor import MediaCursor
+from app.services.folder_sync import FolderSyncService
+from app.workers.video_worker import VideoBatchExtractWorker
+from app.workers.import_worker import ImportProjectWorker
+from app.workers.probe_worker import ProbeMediaWorker
 from app.workers.ai_worker import AiWorker
 from app.common.config import DATA_DIR
-from app.models.schema import MediaItem
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -144,6 +148,9 @@ class MainWindow(QMainWindow):
         self.label_interface.back_clicked.connect(self.return_to_tasks)
         
         self.worker = None      
+        self.import_worker = None
+        self.probe_worker = None
+        self.import_stats = ""
         self.current_project = None
         self.click_pos = None   
         self.ai_worker = AiWorker()
@@ -153,6 +160,22 @@ class MainWindow(QMainWindow):
         self.stack.setCurrentIndex(1)
         self.task_list_interface.refresh_data()
 
+        # 开启了自动同步的项目：监听源文件夹，新文件自动入库
+        self.folder_sync = FolderSyncService(self)
+        self.folder_sync.start()
+
+    def closeEvent(self, event):
+        self.folder_sync.stop()
+        if self.probe_worker is not None:
+            self.probe_worker.stop()
+            self.probe_worker.wait()
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.stop()
+            self.worker.wait()
+        # 退出前写完后台队列中的所有数据库写入
+        shutdown_db_writer()
+        super().closeEvent(event)
+
     def center_window(self):
         screen = QGuiApplication.primaryScreen().availableGeometry()
         size = self.geometry()
@@ -166,8 +189,8 @@ class MainWindow(QMainWindow):
         if page_name == "tasks": self.return_to_tasks()
 
     def return_to_tasks(self):
+        # 任务卡片由数据变更事件保持最新，切换页面不需要重建
         self.stack.setCurrentIndex(1)
-        self.task_list_interface.refresh_data()
 
     def pressWindow(self, event):
         if event.button() == Qt.LeftButton: self.click_pos = event.globalPos()
@@ -179,58 +202,133 @@ class MainWindow(QMainWindow):
             self.click_pos = event.globalPos()
 
     def start_import(self, config_data):
-        path = config_data['folder']
-        project, videos, img_count = DataManager.import_folder(path, model_path=config_data['model'], class_list_str=config_data['classes'])
-        if img_count == 0 and len(videos) == 0:
+        # 后台导入：工作线程扫描，改动按批交给写线程。可取消：新建的任务整体删除，已有任务保留已同步的目录
+        self.import_dialog = QProgressDialog("正在导入...", "取消", 0, 0, self)
+        self.import_dialog.setWindowTitle("导入任务")
+        self.import_dialog.setWindowModality(Qt.WindowModal)
+        self.import_dialog.setMinimumDuration(0)
+        self.import_dialog.setAutoClose(False)
+        self.import_dialog.setAutoReset(False)
+        self.import_dialog.show()
+
+        self.import_worker = ImportProjectWorker(config_data['folder'], model_path=config_data['model'],
+                                                 class_names=config_data['classes'],
+                                                 project_name=config_data.get('name'),
+                                                 dedup_mode=config_data.get('dedup'),
+                                                 dedup_similar=config_data.get('phash'))
+        self.import_worker.progress_signal.connect(self.on_import_progress)
+        self.import_worker.finished_signal.connect(self.on_import_done)
+        self.import_dialog.canceled.connect(self.import_worker.stop)
+        self.import_worker.start()
+
+    def on_import_progress(self, done, total, text):
+        # total 为 0 时（扫描阶段总数未知）显示忙碌进度条
+        self.import_dialog.setRange(0, total)
+        if total:
+            self.import_dialog.setValue(done)
+        self.import_dialog.setLabelText(text)
+
+    def on_import_done(self, result):
+        self.import_dialog.canceled.disconnect(self.import_worker.stop)
+        self.import_dialog.close()
+
+        if result.get("cancelled"):
+            if result.get("new_project"):
+                QMessageBox.information(self, "已取消", "导入已取消，未创建任务。")
+            else:
+                QMessageBox.information(self, "已取消", "重新扫描已取消，已同步的目录保留，其余目录下次导入时继续同步。")
+            return
+        if not result.get("ok"):
+            QMessageBox.critical(self, "导入失败", result.get("error") or "未知错误")
+            return
+
+        project, videos = result["project"], result["videos"]
+        if result["total"] == 0 and len(videos) == 0:
              QMessageBox.warning(self, "警告", "目录中未找到支持的图片或视频文件！")
-             project.delete_instance(); return
-        if config_data.get('name'):
-            project.name = config_data['name']; project.save()
+             # 不等待写线程：队列中排在前面的写入可能较多，删除完成后由 project_deleted 事件刷新列表
+             get_db_writer().submit(DataManager.delete_project, project.id); return
+        self.import_stats = (f"扫描 {result['found']} 张图片，耗时 {result['seconds']:.1f} 秒"
+                             f"（{result['rate']:.0f} 文件/秒）")
+        dup = result.get("duplicates")
+        if dup:
+            self.import_stats += f"\n完全相同的图片：{dup['groups']} 组，重复 {dup['duplicates']} 张"
+            if dup['linked']:
+                self.import_stats += f"（已关联 {dup['linked']} 张，标注将同步）"
+            if dup['skipped']:
+                self.import_stats += f"\n已跳过重复图片 {dup['skipped']} 张"
+            if dup['conflicts']:
+                self.import_stats += f"\n{dup['conflicts']} 张重复图片与首图的标注不一致，未关联，请手动核对"
+            if dup['similar_groups'] is not None:
+                self.import_stats += f"\n相似图片：{dup['similar_groups']} 组"
         self.current_project = project
         if videos: self.process_videos(videos)
         else: self.on_import_finished()
 
     def process_videos(self, videos):
-        video_path = videos[0]
+        # 所有视频并行抽帧（进程池），每个视频完成即登记到项目
         self.progress_dialog = QProgressDialog("正在抽帧...", "取消", 0, 100, self)
         self.progress_dialog.setWindowModality(Qt.WindowModal)
         self.progress_dialog.setMinimumDuration(0)
+        self.progress_dialog.setAutoClose(False)
+        self.progress_dialog.setAutoReset(False)
         self.progress_dialog.show()
         output_dir = os.path.join(DATA_DIR, "frames")
-        self.worker = VideoExtractWorker(video_path, output_dir, fps=1)
-        self.worker.progress_signal.connect(self.progress_dialog.setValue)
-        self.worker.progress_signal.connect(self.progress_dialog.setLabelText)
-        self.worker.finished_signal.connect(lambda dir: self.on_video_finished(dir, video_path))
+        self.video_progress = {}  # 视频序号 -> 进度
+        self.worker = VideoBatchExtractWorker(self.current_project.id, videos, output_dir, fps=1)
+        self.worker.progress_signal.connect(self.on_video_progress)
+        self.worker.video_progress_signal.connect(self.on_single_video_progress)
+        self.worker.finished_signal.connect(self.on_video_finished)
+        self.progress_dialog.canceled.connect(self.worker.stop)
         self.worker.start()
 
-    def on_video_finished(self, frame_dir, video_path):
+    def on_single_video_progress(self, index, value, text):
+        self.video_progress[index] = value
+
+    def on_video_progress(self, value, text):
+        # 总体进度 + 正在处理的视频（最多显示 4 个）
+        names = self.worker.video_paths
+        active = [f"{os.path.basename(names[i])}：{p}%" for i, p in sorted(self.video_progress.items()) if p < 100]
+        self.progress_dialog.setValue(value)
+        self.progress_dialog.setLabelText("\n".join([text] + active[:4]))
+
+    def on_video_finished(self, result):
+        self.progress_dialog.canceled.disconnect(self.worker.stop)
         self.progress_dialog.close()
-        count = DataManager.add_frames(self.current_project.id, frame_dir, video_path)
-        QMessageBox.information(self, "完成", f"视频处理完成，生成 {count} 张图片")
+        videos = result["videos"]
+        failed = [v for v in videos if v["error"]]
+        lines = [f"{len(videos)} 个视频，生成 {result['frames']} 张图片，耗时 {result['seconds']:.1f} 秒"]
+        if result["dropped"]:
+            lines.append(f"已丢弃 {result['dropped']} 张近似重复的帧")
+        if result["cancelled"]:
+            lines.insert(0, "抽帧已取消，已完成的视频帧已加入任务。")
+        lines += [f"失败：{os.path.basename(v['path'])}（{v['error']}）" for v in failed[:5]]
+        QMessageBox.information(self, "完成", "\n".join(lines))
         self.on_import_finished()
 
     def on_import_finished(self):
-        self.task_list_interface.refresh_data()
-        QMessageBox.information(self, "成功", "任务创建成功！")
+        QMessageBox.information(self, "成功", f"任务创建成功！\n{self.import_stats}")
 
     def enter_labeling_mode(self, project_obj):
         self.current_project = project_obj
-        items = MediaItem.select().where(MediaItem.project == self.current_project).order_by(MediaItem.file_path)
-        all_files = [item.file_path for item in items]
-        if not all_files:
+        # 定位到第一张未标注（索引查询，只读一页）
+        cursor = MediaCursor(self.current_project)
+        target = cursor.seek_first_unlabeled()
+        if target is None:
             QMessageBox.information(self, "提示", "没有图片")
             return
-        self.ai_worker.update_config(project_obj.model_path, project_obj.classes)
+        self.ai_worker.update_config(project_obj.model_path, DataManager.get_label_names(project_obj))
         self.stack.setCurrentIndex(2)
         
         # === 关键：传递 Project 对象，确保能加载和保存历史标签 ===
         self.label_interface.set_project(project_obj)
         
-        target_path = all_files[0]
-        for item in items:
-            if not item.is_labeled: target_path = item.file_path; break
-        self.label_interface.load_file_list(all_files, target_path)
-        self.label_interface.load_image(target_path)
+        self.label_interface.set_media_cursor(cursor)
+        self.label_interface.open_media(target)
+
+        # 旧项目 / 上次被中断的探测：后台补齐图片头信息
+        if DataManager.count_pending_probe(project_obj) and not (self.probe_worker and self.probe_worker.isRunning()):
+            self.probe_worker = ProbeMediaWorker(project_obj.id)
+            self.probe_worker.start()
 
     def run_ai(self, image_path):
         if not self.ai_worker.isRunning():
@@ -239,12 +337,12 @@ class MainWindow(QMainWindow):
     def on_ai_model_changed(self, model_path: str):
         """用户在标注页选择/切换 AI 模型后，立即更新推理线程配置。"""
         try:
-            classes_str = self.current_project.classes if self.current_project else None
+            class_names = DataManager.get_label_names(self.current_project) if self.current_project else None
         except Exception:
-            classes_str = None
+            class_names = None
 
         # 立刻更新 worker；如果模型路径无效，实际加载时会在 on_ai_error 里提示
-        self.ai_worker.update_config(model_path, classes_str)
+        self.ai_worker.update_config(model_path, class_names)
     
     def on_ai_finished(self, image_path, results):
         self.label_interface.apply_ai_results(results)
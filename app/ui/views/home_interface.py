@@ -1,11 +1,12 @@
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                                QPushButton, QFileDialog, QFrame, QGridLayout,
                                QDialog, QLineEdit, QFormLayout, QDialogButtonBox,
-                               QListWidget, QListWidgetItem,
+                               QListWidget, QListWidgetItem, QComboBox, QCheckBox,
                                QGraphicsDropShadowEffect)
 from PySide6.QtCore import Qt, Signal
 from PySide6.QtGui import QColor
 from app.services.data_manager import DataManager
+from app.services.event_bus import event_bus
 import os
 
 # 统一模型文件过滤器：优先使用全局 config（如果你已添加），否则使用本地 fallback
@@ -31,7 +32,7 @@ class NewProjectDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("创建新任务")
-        self.setFixedSize(480, 350)
+        self.setFixedSize(480, 420)
         self.setStyleSheet("""
             QDialog { background-color: #ffffff; }
             QLabel { font-size: 14px; color: #555; }
@@ -101,6 +102,21 @@ class NewProjectDialog(QDialog):
         self.input_classes.setPlaceholderText("例如: person, car")
         form.addRow("标签:", self.input_classes)
 
+        # 5. 重复图片处理（按内容哈希；相似图片按感知哈希，仅报告）
+        dedup_layout = QHBoxLayout()
+        self.dedup_combo = QComboBox()
+        for text, mode in (("不检测", 'off'), ("仅报告", 'report'),
+                           ("重复图片共享标注", 'link'), ("跳过重复图片", 'skip')):
+            self.dedup_combo.addItem(text, mode)
+        self.dedup_combo.setCurrentIndex(1)
+        self.similar_check = QCheckBox("相似图片")
+        self.similar_check.setToolTip("额外计算感知哈希，报告重新编码 / 缩放后的近似重复图片（较慢）")
+        self.dedup_combo.currentIndexChanged.connect(
+            lambda: self.similar_check.setEnabled(self.dedup_combo.currentData() != 'off'))
+        dedup_layout.addWidget(self.dedup_combo, 1)
+        dedup_layout.addWidget(self.similar_check)
+        form.addRow("查重:", dedup_layout)
+
         layout.addLayout(form)
         layout.addStretch(1)
 
@@ -152,7 +168,9 @@ class NewProjectDialog(QDialog):
             'name': self.input_name.text().strip(),
             'folder': self.folder_path,
             'model': self.model_path if self.model_path else None,
-            'classes': self.input_classes.text().strip()
+            'classes': [c.strip() for c in self.input_classes.text().split(',') if c.strip()],
+            'dedup': self.dedup_combo.currentData(),
+            'phash': self.similar_check.isEnabled() and self.similar_check.isChecked()
         }
 # ...
 # ... (StatCard 和 HomeInterface 的其余部分不需要变，为了简洁这里省略) ...
@@ -178,15 +196,18 @@ class StatCard(QFrame):
 
         lbl_title = QLabel(title)
         lbl_title.setStyleSheet("color: #666; font-size: 13px; text-transform: uppercase;")
-        lbl_value = QLabel(str(value))
-        lbl_value.setStyleSheet("color: #333; font-size: 20px; font-weight: bold;")
+        self.lbl_value = QLabel(str(value))
+        self.lbl_value.setStyleSheet("color: #333; font-size: 20px; font-weight: bold;")
 
         text_layout.addWidget(lbl_title)
-        text_layout.addWidget(lbl_value)
+        text_layout.addWidget(self.lbl_value)
         layout.addWidget(icon_box)
         layout.addWidget(text_box)
         layout.addStretch(1)
 
+    def set_value(self, value):
+        self.lbl_value.setText(str(value))
+
 # === 首页主类 ===
 class HomeInterface(QWidget):
     project_selected = Signal(dict)  # 修改信号类型：传字典
@@ -194,8 +215,16 @@ class HomeInterface(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.current_folder = ""  # 当前选择的数据文件夹
+        self.project_totals = {}  # project_id -> [图片数, 已标注数]
         self.initUI()
 
+        # 数据变更事件：只修补受影响项目的计数，切换页面无需重查
+        event_bus.project_created.connect(self.on_project_changed)
+        event_bus.media_added.connect(self.on_media_added)
+        event_bus.project_deleted.connect(self.on_project_deleted)
+        event_bus.image_labeled.connect(self.on_image_labeled)
+        event_bus.stats_rebuilt.connect(self.refresh_stats)
+
     def initUI(self):
         main_layout = QVBoxLayout(self)
         main_layout.setContentsMargins(30, 30, 30, 30)
@@ -218,6 +247,14 @@ class HomeInterface(QWidget):
 
         self.stats_layout = QGridLayout()
         self.stats_layout.setSpacing(20)
+        self.card_projects = StatCard("总项目数", 0, "📁", "#17a2b8")
+        self.card_images = StatCard("图片总数", 0, "🖼️", "#28a745")
+        self.card_labeled = StatCard("已标注", 0, "🏷️", "#ffc107")
+        self.card_rate = StatCard("完成率", "0%", "📈", "#dc3545")
+        self.stats_layout.addWidget(self.card_projects, 0, 0)
+        self.stats_layout.addWidget(self.card_images, 0, 1)
+        self.stats_layout.addWidget(self.card_labeled, 0, 2)
+        self.stats_layout.addWidget(self.card_rate, 0, 3)
         main_layout.addLayout(self.stats_layout)
         self.refresh_stats()
         main_layout.addStretch(1)
@@ -257,19 +294,42 @@ class HomeInterface(QWidget):
         main_layout.addLayout(bottom_row)
 
     def refresh_stats(self):
-        for i in reversed(range(self.stats_layout.count())):
-            self.stats_layout.itemAt(i).widget().setParent(None)
-
+        """全量加载各项目计数（首次显示 / 计数器重建后）"""
         projects = DataManager.get_all_projects_stats()
-        total_projects = len(projects)
-        total_images = sum(p['total'] for p in projects)
-        total_labeled = sum(p['labeled'] for p in projects)
+        self.project_totals = {p['id']: [p['total'], p['labeled']] for p in projects}
+        self.update_stat_cards()
+
+    def update_stat_cards(self):
+        total_projects = len(self.project_totals)
+        total_images = sum(t[0] for t in self.project_totals.values())
+        total_labeled = sum(t[1] for t in self.project_totals.values())
         rate = int((total_labeled / total_images * 100)) if total_images > 0 else 0
 
-        self.stats_layout.addWidget(StatCard("总项目数", total_projects, "📁", "#17a2b8"), 0, 0)
-        self.stats_layout.addWidget(StatCard("图片总数", total_images, "🖼️", "#28a745"), 0, 1)
-        self.stats_layout.addWidget(StatCard("已标注", total_labeled, "🏷️", "#ffc107"), 0, 2)
-        self.stats_layout.addWidget(StatCard("完成率", f"{rate}%", "📈", "#dc3545"), 0, 3)
+        self.card_projects.set_value(total_projects)
+        self.card_images.set_value(total_images)
+        self.card_labeled.set_value(total_labeled)
+        self.card_rate.set_value(f"{rate}%")
+
+    def on_project_changed(self, project_id):
+        p = DataManager.get_project_stats(project_id)
+        if p is None:
+            return
+        self.project_totals[project_id] = [p['total'], p['labeled']]
+        self.update_stat_cards()
+
+    def on_media_added(self, project_id, count):
+        self.on_project_changed(project_id)
+
+    def on_project_deleted(self, project_id):
+        if self.project_totals.pop(project_id, None) is not None:
+            self.update_stat_cards()
+
+    def on_image_labeled(self, project_id, media_id, labeled):
+        totals = self.project_totals.get(project_id)
+        if totals is None:
+            return
+        totals[1] += 1 if labeled else -1
+        self.update_stat_cards()
 
     def open_dialog(self):
         dialog = NewProjectDialog(self)
@@ -313,6 +373,6 @@ class HomeInterface(QWidget):
 
     def showEvent(self, event):
         super().showEvent(event)
-        self.refresh_stats()
+        # 计数已由事件保持最新，这里不再重查数据库
         if self.current_folder:
             self.update_file_info(self.current_folder)
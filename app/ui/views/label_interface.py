@@ -1,9 +1,10 @@
-import json
 import os
 import sys
 import math
 import hashlib
 
+import numpy as np
+
 # === 修复核心 1: 补全 QGraphicsLineItem，彻底解决多边形画线崩溃问题 ===
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
                                QPushButton, QLabel, QGraphicsView,
@@ -11,7 +12,7 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
                                QGraphicsPathItem, QGraphicsItem, QFrame, QMessageBox,
                                QListWidget, QListWidgetItem, QGraphicsLineItem, QGraphicsEllipseItem,
                                QSplitter, QButtonGroup, QGraphicsTextItem, QDialog, QTableWidget, QTableWidgetItem, QHeaderView,
-                               QStyle, QScrollArea, QGraphicsDropShadowEffect, QApplication, QFileDialog)
+                               QStyle, QScrollArea, QGraphicsDropShadowEffect, QApplication, QFileDialog, QInputDialog)
 from PySide6.QtCore import Qt, Signal, QRectF, QPointF, QSize
 from PySide6.QtGui import QPixmap, QPainter, QWheelEvent, QPen, QColor, QBrush, QPolygonF, QPainterPath, QFont, QAction, QKeySequence, QIcon, QShortcut
 from PySide6.QtGui import QCursor
@@ -20,7 +21,10 @@ from PySide6.QtSvg import QSvgRenderer
 from app.ui.components.label_dialog import LabelDialog
 from app.ui.components.export_dialog import ExportDialog
 from app.services.data_manager import DataManager
-from app.models.schema import MediaItem
+from app.services.db_writer import get_db_writer
+from app.services.event_bus import event_bus
+from app.models.schema import new_uid
+from app.models.fields import decode_points
 from app.ui.components.sidebar import render_icon_with_bg
 
 
@@ -118,7 +122,7 @@ class ShortcutDialog(QDialog):
             QPushButton:hover { background-color: #2563EB; }
         """)
         layout = QVBoxLayout(self)
-        table = QTableWidget(6, 2)
+        table = QTableWidget(7, 2)
         table.setHorizontalHeaderLabels(["功能", "按键"])
         table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         table.verticalHeader().setVisible(False)
@@ -131,6 +135,7 @@ class ShortcutDialog(QDialog):
             ("多边形标注", "P"),
             ("上一张", "A"),
             ("下一张", "D"),
+            ("跳转到第 N 张", "G"),
             ("撤销/回退", "Ctrl+Z"),
         ]
         for i, (desc, key) in enumerate(data):
@@ -504,6 +509,22 @@ _LABEL_COLOR_PALETTE = [
 ]
 
 
+def polygon_from_points(points, img_w: float, img_h: float):
+    """归一化点集（(N, 2) 数组 / 列表 / JSON）-> 场景坐标 QPointF 列表"""
+    arr = decode_points(points)
+    if arr is None or not len(arr):
+        return []
+    scaled = (arr * np.array([img_w, img_h], dtype=np.float64)).tolist()
+    return [QPointF(x, y) for x, y in scaled]
+
+
+def points_from_polygon(poly: QPolygonF, img_w: float, img_h: float) -> np.ndarray:
+    """QPolygonF（场景坐标）-> 归一化 (N, 2) float32 数组"""
+    arr = np.array([(p.x(), p.y()) for p in poly], dtype=np.float64).reshape(-1, 2)
+    arr /= np.array([img_w, img_h], dtype=np.float64)
+    return arr.astype(np.float32)
+
+
 def color_for_label(label: str, classes=None) -> QColor:
     """Get a stable QColor for a label.
 
@@ -530,9 +551,11 @@ def color_for_label(label: str, classes=None) -> QColor:
 
 
 class RectShape(QGraphicsRectItem):
-    def __init__(self, rect, label, color: QColor = None):
+    def __init__(self, rect, label, color: QColor = None, uid: str = None):
         super().__init__(rect)
         self.label = label
+        # 标注稳定标识：从数据库加载时沿用，新建时生成；保存时据此只写入有变化的行
+        self.uid = uid or new_uid()
         if color is None:
             color = color_for_label(label)
         self._color = QColor(color)
@@ -548,9 +571,10 @@ class RectShape(QGraphicsRectItem):
 
 
 class PolyShape(QGraphicsPolygonItem):
-    def __init__(self, points, label, color: QColor = None):
+    def __init__(self, points, label, color: QColor = None, uid: str = None):
         super().__init__(QPolygonF(points))
         self.label = label
+        self.uid = uid or new_uid()
         if color is None:
             color = color_for_label(label)
         self._color = QColor(color)
@@ -570,6 +594,7 @@ class LabelInterface(QWidget):
     # 当用户在标注页中切换/新增 AI 模型时，通知 MainWindow 立即更新 ai_worker 配置
     ai_model_changed_signal = Signal(str)
     back_clicked = Signal()
+    _save_done = Signal(object, object, object)  # 写线程回调 -> 界面线程：media, (保存前, 保存后) 的标注状态, future
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -580,8 +605,8 @@ class LabelInterface(QWidget):
         self.current_project = None
         self.project_classes = []
         self.current_image_path = None
-        self.all_files = []
-        self.current_index = -1
+        self.current_media = None  # 当前图片的 MediaItem（来自 MediaCursor，带 is_labeled / annotation_count）
+        self.media_cursor = None  # MediaCursor：按页读取项目图片，不持有全量列表
 
         self.scene = QGraphicsScene(self)
         self.view = ImageViewer(self)
@@ -604,29 +629,53 @@ class LabelInterface(QWidget):
 
         self.initShortcuts()
 
+        # 自动同步向当前项目加入新图片时，就地更新序号与文件列表
+        event_bus.media_added.connect(self.on_media_added)
+        self._save_done.connect(self.on_silent_save_done)
+
     def set_project(self, project_obj):
         self.current_project = project_obj
-        if project_obj and getattr(project_obj, "classes", None):
-            self.project_classes = [c.strip() for c in project_obj.classes.split(',') if c.strip()]
-        else:
-            self.project_classes = []
+        self.project_classes = DataManager.get_label_names(project_obj) if project_obj else []
         self.refresh_task_classes_ui()
 
+    def save_project_fields(self, **fields):
+        """修改当前项目属性：内存对象立即生效，数据库写入交给后台写线程"""
+        if not self.current_project:
+            return
+        for name, value in fields.items():
+            setattr(self.current_project, name, value)
+        get_db_writer().submit(DataManager.update_project, self.current_project.id,
+                               key=("project", self.current_project.id), **fields)
+
+    def save_project_labels(self):
+        """把新增的类别写入项目 Label 表（后台写线程，已存在的类别不变）"""
+        if not self.current_project:
+            return
+        get_db_writer().submit(DataManager.ensure_labels, self.current_project.id, list(self.project_classes),
+                               key=("labels", self.current_project.id))
+
     def get_label_color(self, label: str) -> QColor:
         """Return stable color for a given label within current project."""
         return color_for_label(label, self.project_classes)
 
-    def load_file_list(self, all_files, target_path):
-        self.all_files = all_files or []
+    def set_media_cursor(self, cursor):
+        """设置项目图片游标（已定位到要打开的图片）"""
+        self.media_cursor = cursor
+        current = cursor.current() if cursor else None
         # 更新右下角文件夹内容列表（基于目标文件所在目录）
         try:
-            self.update_file_info_list(os.path.dirname(target_path) if target_path else "")
+            self.update_file_info_list(os.path.dirname(current.file_path) if current else "")
         except Exception:
             pass
-        try:
-            self.current_index = self.all_files.index(target_path)
-        except Exception:
-            self.current_index = -1
+
+    def on_media_added(self, project_id, count):
+        """当前项目新增了图片（如文件夹自动同步）：游标总数与当前序号重新定位，不重新加载当前图片"""
+        if not self.current_project or project_id != self.current_project.id or not self.media_cursor:
+            return
+        self.media_cursor.reload()
+        self.update_media_info()
+        if self.current_image_path:
+            self.update_file_info_list(os.path.dirname(self.current_image_path))
 
     def update_file_info_list(self, folder_path: str):
         """更新右下角『文件信息』：显示指定文件夹内的文件列表（仅第一层）。"""
@@ -957,8 +1006,12 @@ class LabelInterface(QWidget):
         sc_backspace.setContext(Qt.WidgetWithChildrenShortcut)
         sc_backspace.activated.connect(lambda: None if _modal_open() else self.delete_selected_shapes())
 
+        sc_goto = QShortcut(QKeySequence("G"), self)
+        sc_goto.setContext(Qt.WidgetWithChildrenShortcut)
+        sc_goto.activated.connect(lambda: None if _modal_open() else self.goto_image())
+
         # 防止被垃圾回收
-        self._shortcuts = [sc_prev, sc_next, sc_delete, sc_backspace]
+        self._shortcuts = [sc_prev, sc_next, sc_delete, sc_backspace, sc_goto]
 
 
     def show_shortcuts(self):
@@ -990,8 +1043,7 @@ class LabelInterface(QWidget):
             if label not in self.project_classes:
                 self.project_classes.append(label)
                 if self.current_project:
-                    self.current_project.classes = ",".join(self.project_classes)
-                    self.current_project.save()
+                    self.save_project_labels()
                     self.refresh_task_classes_ui()
 
             if shape_type == "rect":
@@ -1159,7 +1211,29 @@ class LabelInterface(QWidget):
             pass
         self.refresh_label_list()
 
-    def load_image(self, image_path: str):
+    def open_media(self, media):
+        """打开游标中的一张图片：之后的标注读写都按 media.id 进行，不再按路径查库"""
+        self.current_media = media
+        size = (media.width, media.height) if media.width and media.height else None
+        self.load_image(media.file_path, size)
+        self.update_media_info()
+
+    def update_media_info(self):
+        """右侧『文件信息』：路径、序号与预取的标注状态"""
+        media = self.current_media
+        if not media:
+            return
+        lines = [media.file_path]
+        if self.media_cursor:
+            lines.append(f"第 {self.media_cursor.index + 1} / {len(self.media_cursor)} 张")
+        if media.width and media.height:
+            lines.append(f"{media.width} × {media.height}")
+        status = "已标注" if media.is_labeled else "未标注"
+        lines.append(f"{status} · {getattr(media, 'annotation_count', 0)} 个标注")
+        self.lblFile.setText("\n".join(lines))
+
+    def load_image(self, image_path: str, size=None):
+        """加载图片到画布；size=(宽, 高) 为导入时探测的尺寸，已知时画布范围与标注换算直接使用它"""
         self.current_image_path = image_path
         self.lblFile.setText(image_path or "未选择")
 
@@ -1202,7 +1276,10 @@ class LabelInterface(QWidget):
             return
 
         self.image_item = self.scene.addPixmap(pm)
-        self.scene.setSceneRect(QRectF(pm.rect()))
+        # 文件在探测之后被改写（尺寸不一致）时以实际图像为准
+        if size is None or (pm.width(), pm.height()) != tuple(size):
+            size = (pm.width(), pm.height())
+        self.scene.setSceneRect(QRectF(0, 0, size[0], size[1]))
         self.view.fitInView(self.scene.sceneRect(), Qt.KeepAspectRatio)
 
         # 从数据库加载标注（原版逻辑）
@@ -1211,24 +1288,24 @@ class LabelInterface(QWidget):
         self.refresh_label_list()
 
     def load_annotations_from_db(self):
-        if not self.current_image_path:
+        media = self.current_media
+        if not media:
             return
 
-        media_item = MediaItem.get_or_none(MediaItem.file_path == self.current_image_path)
-        if not media_item:
-            return
+        # 该图片若还有排队中的保存，先等它写完，避免读到旧标注
+        get_db_writer().wait_for(("save", media.id))
 
         img_w = self.view.sceneRect().width()
         img_h = self.view.sceneRect().height()
         if img_w <= 0 or img_h <= 0:
             return
 
-        for ann in media_item.annotations:
-            if getattr(ann, "shape_type", "") == "poly" and getattr(ann, "points", None):
+        for ann in DataManager.get_annotations(media.id):
+            label = ann.label.name
+            if getattr(ann, "shape_type", "") == "poly" and getattr(ann, "points", None) is not None:
                 try:
-                    pts = json.loads(ann.points)
-                    qpoints = [QPointF(p[0] * img_w, p[1] * img_h) for p in pts]
-                    item = PolyShape(qpoints, ann.label, self.get_label_color(ann.label))
+                    qpoints = polygon_from_points(ann.points, img_w, img_h)
+                    item = PolyShape(qpoints, label, self.get_label_color(label), uid=ann.uid)
                     self.scene.addItem(item)
                     self.annotations.append(item)
                 except Exception:
@@ -1241,30 +1318,17 @@ class LabelInterface(QWidget):
                     x = (ann.x * img_w) - (w / 2)
                     y = (ann.y * img_h) - (h / 2)
                     rect = QRectF(x, y, w, h)
-                    item = RectShape(rect, ann.label, self.get_label_color(ann.label))
+                    item = RectShape(rect, label, self.get_label_color(label), uid=ann.uid)
                     self.scene.addItem(item)
                     self.annotations.append(item)
                 except Exception:
                     pass
 
-        # 若 DB 中出现了新的 label，而 Project.classes 为空或缺失，则自动补齐到『任务历史标签』
-        try:
-            changed = False
-            for it in self.annotations:
-                lbl = getattr(it, "label", None)
-                if lbl and lbl not in self.project_classes:
-                    self.project_classes.append(lbl)
-                    changed = True
-            if changed:
-                if self.current_project:
-                    self.current_project.classes = ",".join(self.project_classes)
-                    self.current_project.save()
-                self.refresh_task_classes_ui()
-        except Exception:
-            pass
+        # 标注引用的类别都在项目 Label 表中（set_project 时已载入『任务历史标签』），无需再补齐
 
     def save_current_work(self, silent=True):
-        if not self.current_image_path:
+        media = self.current_media
+        if not media:
             if not silent:
                 QMessageBox.information(self, "提示", "请先加载图像。")
             return
@@ -1286,6 +1350,7 @@ class LabelInterface(QWidget):
                 w = r.width() / img_w
                 h = r.height() / img_h
                 box_data.append({
+                    "uid": it.uid,
                     "shape_type": "rect",
                     "label": it.label,
                     "x": x, "y": y, "w": w, "h": h,
@@ -1294,21 +1359,40 @@ class LabelInterface(QWidget):
 
             elif isinstance(it, PolyShape):
                 poly = it.polygon()
-                pts = [(float(poly[i].x()) / img_w, float(poly[i].y()) / img_h) for i in range(poly.count())]
+                pts = points_from_polygon(poly, img_w, img_h)
                 br = poly.boundingRect()
                 cx = br.center().x() / img_w
                 cy = br.center().y() / img_h
                 w = br.width() / img_w
                 h = br.height() / img_h
                 box_data.append({
+                    "uid": it.uid,
                     "shape_type": "poly",
                     "label": it.label,
                     "x": cx, "y": cy, "w": w, "h": h,
                     "rect": [cx, cy, w, h],
-                    "points": json.dumps(pts)
+                    "points": pts
                 })
 
-        ok = DataManager.save_annotations(self.current_image_path, box_data)
+        # 交给后台写线程；连续快速切图时同一张图的多次保存会被合并
+        future = get_db_writer().submit(DataManager.save_annotations, media.id, box_data,
+                                        key=("save", media.id))
+        # 游标窗口中的预取信息同步更新，来回切图无需重新查库；写入失败时在 on_silent_save_done 中还原
+        previous = (media.is_labeled, getattr(media, "annotation_count", 0))
+        media.is_labeled = bool(box_data)
+        media.annotation_count = len(box_data)
+        self.update_media_info()
+        if silent:
+            if hasattr(self, "btnSaveBig"):
+                self.btnSaveBig.setText("✅ 已保存")
+            states = (previous, (media.is_labeled, media.annotation_count))
+            future.add_done_callback(lambda f, m=media, st=states: self._emit_save_done(m, st, f))
+            return
+
+        try:
+            ok = future.result()
+        except Exception:
+            ok = False
 
         if ok:
             if not silent:
@@ -1320,6 +1404,31 @@ class LabelInterface(QWidget):
             if not silent:
                 QMessageBox.warning(self, "保存失败", "保存失败，请检查数据库/路径。")
 
+    def _emit_save_done(self, media, states, future):
+        # 在写线程中调用：经信号排队回到界面线程；界面已销毁时忽略
+        try:
+            self._save_done.emit(media, states, future)
+        except RuntimeError:
+            pass
+
+    def on_silent_save_done(self, media, states, future):
+        """静默保存（切图时）写入失败：还原游标中的标注状态并提示"""
+        try:
+            ok = future.result()
+        except Exception:
+            ok = False
+        if ok:
+            return
+        previous, saved = states
+        # 之后又保存过同一张图（状态已不是本次写入的）时不覆盖
+        if (media.is_labeled, media.annotation_count) == saved:
+            media.is_labeled, media.annotation_count = previous
+        if media is self.current_media:
+            self.update_media_info()
+            if hasattr(self, "btnSaveBig"):
+                self.btnSaveBig.setText("❌ 保存失败")
+        QMessageBox.warning(self, "保存失败", f"{media.name} 的标注未能保存，请检查数据库/路径。")
+
     def choose_ai_model(self):
         """新增/切换 AI 模型：选择模型文件 -> 写入 Project -> 通知 MainWindow 更新 ai_worker。"""
         if not self.current_project:
@@ -1347,8 +1456,7 @@ class LabelInterface(QWidget):
 
         # 写入 Project（peewee Model）并持久化
         try:
-            self.current_project.model_path = file_path
-            self.current_project.save()
+            self.save_project_fields(model_path=file_path)
         except Exception:
             # 即便写库失败，也尽量让当前会话可用
             pass
@@ -1387,7 +1495,7 @@ class LabelInterface(QWidget):
         if not results:
             return
 
-        # AI 结果可能包含新的类别：同步进 Project.classes，并刷新右侧『任务历史标签』
+        # AI 结果可能包含新的类别：同步进项目 Label 表，并刷新右侧『任务历史标签』
         try:
             changed = False
             for ann in results:
@@ -1396,9 +1504,7 @@ class LabelInterface(QWidget):
                     self.project_classes.append(lbl)
                     changed = True
             if changed:
-                if self.current_project:
-                    self.current_project.classes = ",".join(self.project_classes)
-                    self.current_project.save()
+                self.save_project_labels()
                 self.refresh_task_classes_ui()
         except Exception:
             pass
@@ -1418,9 +1524,8 @@ class LabelInterface(QWidget):
 
         try:
             for ann in results:
-                if ann.get("shape_type") == "poly" and ann.get("points"):
-                    pts = json.loads(ann["points"])
-                    qpoints = [QPointF(p[0] * img_w, p[1] * img_h) for p in pts]
+                if ann.get("shape_type") == "poly" and ann.get("points") is not None:
+                    qpoints = polygon_from_points(ann["points"], img_w, img_h)
                     lbl = ann.get("label", "Object")
                     item = PolyShape(qpoints, lbl, self.get_label_color(lbl))
                     self.scene.addItem(item)
@@ -1452,27 +1557,49 @@ class LabelInterface(QWidget):
         if not data or not data.get("path"):
             return
         try:
+            # 导出前等待后台写线程写完所有标注
+            get_db_writer().flush()
             DataManager.export_dataset(self.current_project, data['path'], data['format'])
             QMessageBox.information(self, "导出完成", "导出成功。")
         except Exception as e:
             QMessageBox.warning(self, "导出失败", f"{e}")
 
     def prev_image(self):
-        if not self.all_files:
+        if not self.media_cursor:
             return
-        if self.current_index <= 0:
+        if self.media_cursor.index <= 0:
             return
         self.save_current_work(silent=True)
-        self.current_index -= 1
-        self.load_image(self.all_files[self.current_index])
+        media = self.media_cursor.prev()
+        if media:
+            self.open_media(media)
 
     def next_image(self):
-        if not self.all_files:
+        if not self.media_cursor:
+            return
+        if self.media_cursor.index < 0:
+            return
+        if self.media_cursor.index >= len(self.media_cursor) - 1:
             return
-        if self.current_index < 0:
+        self.save_current_work(silent=True)
+        media = self.media_cursor.next()
+        if media:
+            self.open_media(media)
+
+    def goto_image(self, index=None):
+        """跳转到第 index 张（从 0 开始）；不传时弹出输入框（从 1 开始计数）"""
+        if not self.media_cursor or not len(self.media_cursor):
             return
-        if self.current_index >= len(self.all_files) - 1:
+        if index is None:
+            total = len(self.media_cursor)
+            num, ok = QInputDialog.getInt(self, "跳转", f"跳转到第几张（1 - {total}）：",
+                                          self.media_cursor.index + 1, 1, total)
+            if not ok:
+                return
+            index = num - 1
+        if index == self.media_cursor.index:
             return
         self.save_current_work(silent=True)
-        self.current_index += 1
-        self.load_image(self.all_files[self.current_index])
+        media = self.media_cursor.seek(index)
+        if media:
+            self.open_media(media)
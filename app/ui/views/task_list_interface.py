@@ -1,11 +1,16 @@
 import os
-from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QCheckBox,
                                QPushButton, QScrollArea, QFrame, QProgressBar, QMessageBox,
-                               QGraphicsDropShadowEffect)
+                               QProgressDialog, QGraphicsDropShadowEffect, QMenu, QFileDialog)
 from PySide6.QtCore import Qt, Signal, QSize, QPropertyAnimation, QEasingCurve, QPoint
 from PySide6.QtGui import QColor, QIcon, QPainter, QPainterPath
 
+from app.common.config import SUPPORTED_VIDEO_EXT
 from app.services.data_manager import DataManager
+from app.services.event_bus import event_bus
+from app.services.db_writer import get_db_writer
+from app.workers.delete_worker import DeleteProjectWorker
+from app.workers.validate_worker import ValidateMediaWorker
 from app.ui.components.export_dialog import ExportDialog
 from app.ui.components.flow_layout import FlowLayout
 from app.ui.views.home_interface import NewProjectDialog
@@ -15,6 +20,9 @@ class TaskCard(QFrame):
     enter_clicked = Signal(object)  # 信号：进入项目
     export_clicked = Signal(object) # 信号：导出
     delete_clicked = Signal(object) # 信号：删除
+    sync_toggled = Signal(object, bool)  # 信号：开关文件夹自动同步
+    validate_clicked = Signal(object) # 信号：校验图片
+    relocate_clicked = Signal(object) # 信号：重新定位源文件夹
 
     def __init__(self, project_data, parent=None):
         super().__init__(parent)
@@ -53,44 +61,41 @@ class TaskCard(QFrame):
         layout.addWidget(icon_lbl)
 
         # 2. 标题
-        name_lbl = QLabel(self.data['name'])
-        name_lbl.setStyleSheet("font-size: 15px; font-weight: 700; color: #303133; border: none; background: transparent;")
-        name_lbl.setWordWrap(True)
-        layout.addWidget(name_lbl)
+        self.name_lbl = QLabel(self.data['name'])
+        self.name_lbl.setStyleSheet("font-size: 15px; font-weight: 700; color: #303133; border: none; background: transparent;")
+        self.name_lbl.setWordWrap(True)
+        layout.addWidget(self.name_lbl)
         
         # 3. 进度条
         progress_layout = QVBoxLayout()
-        pg_info = QLabel(f"进度: {self.data['labeled']} / {self.data['total']}")
-        pg_info.setStyleSheet("font-size: 12px; color: #909399; border: none; background: transparent;")
-        
-        progress = QProgressBar()
-        progress.setRange(0, 100)
-        progress.setValue(self.data['progress'])
-        progress.setFixedHeight(6)
-        progress.setTextVisible(False)
-        pg_color = "#007bff"
-        if self.data['status'] == '已完成': pg_color = "#28a745"
-        elif self.data['status'] == '未标注': pg_color = "#dc3545"
-
-        progress.setStyleSheet(f"""
-            QProgressBar {{ border: none; background-color: #f0f2f5; border-radius: 3px; }} 
-            QProgressBar::chunk {{ background-color: {pg_color}; border-radius: 3px; }}
-        """)
-        progress_layout.addWidget(pg_info)
-        progress_layout.addWidget(progress)
+        self.pg_info = QLabel()
+        self.pg_info.setStyleSheet("font-size: 12px; color: #909399; border: none; background: transparent;")
+
+        self.progress = QProgressBar()
+        self.progress.setRange(0, 100)
+        self.progress.setFixedHeight(6)
+        self.progress.setTextVisible(False)
+        progress_layout.addWidget(self.pg_info)
+        progress_layout.addWidget(self.progress)
         layout.addLayout(progress_layout)
 
+        # 自动同步：源文件夹中新拷入的图片自动加入项目
+        self.sync_check = QCheckBox("自动同步新文件")
+        self.sync_check.setCursor(Qt.PointingHandCursor)
+        self.sync_check.setStyleSheet("font-size: 12px; color: #606266; border: none; background: transparent;")
+        self.sync_check.toggled.connect(self.on_sync_toggled)
+        layout.addWidget(self.sync_check)
+
         layout.addStretch(1)
 
         # 4. 底部按钮行
         btn_layout = QHBoxLayout()
-        status_lbl = QLabel(self.data['status'])
-        status_lbl.setStyleSheet(f"color: {self.data['status_color']}; font-weight: 600; font-size: 13px; border: none; background: transparent;")
-        btn_layout.addWidget(status_lbl)
+        self.status_lbl = QLabel()
+        btn_layout.addWidget(self.status_lbl)
         btn_layout.addStretch(1)
 
         btn_export = QPushButton("导出")
-        btn_export.setFixedSize(60, 28)
+        btn_export.setFixedSize(46, 28)
         btn_export.setCursor(Qt.PointingHandCursor)
         btn_export.setStyleSheet("""
             QPushButton {
@@ -106,8 +111,26 @@ class TaskCard(QFrame):
         btn_export.clicked.connect(self.on_export_btn_clicked) # 防止冒泡
         btn_layout.addWidget(btn_export)
 
+        btn_validate = QPushButton("校验")
+        btn_validate.setFixedSize(46, 28)
+        btn_validate.setCursor(Qt.PointingHandCursor)
+        btn_validate.setToolTip("完整解码所有图片，找出损坏 / 截断的文件（不参与标注与导出）")
+        btn_validate.setStyleSheet("""
+            QPushButton {
+                background-color: transparent;
+                border: 1px solid #6c757d;
+                border-radius: 14px;
+                color: #6c757d;
+                font-size: 12px;
+                font-weight: 500;
+            }
+            QPushButton:hover { background-color: #f0f2f5; }
+        """)
+        btn_validate.clicked.connect(self.on_validate_btn_clicked) # 防止冒泡
+        btn_layout.addWidget(btn_validate)
+
         btn_delete = QPushButton("删除")
-        btn_delete.setFixedSize(60, 28)
+        btn_delete.setFixedSize(46, 28)
         btn_delete.setCursor(Qt.PointingHandCursor)
         btn_delete.setStyleSheet("""
             QPushButton {
@@ -124,15 +147,51 @@ class TaskCard(QFrame):
         btn_layout.addWidget(btn_delete)
 
         layout.addLayout(btn_layout)
+        self.update_data(self.data)
+
+    def update_data(self, project_data):
+        """就地更新卡片内容（名称/进度/状态），不重建控件"""
+        self.data = project_data
+        self.name_lbl.setText(self.data['name'])
+        self.pg_info.setText(f"进度: {self.data['labeled']} / {self.data['total']}")
+        self.progress.setValue(self.data['progress'])
+        self.sync_check.blockSignals(True)
+        self.sync_check.setChecked(bool(self.data.get('auto_sync')))
+        self.sync_check.blockSignals(False)
+
+        pg_color = "#007bff"
+        if self.data['status'] == '已完成': pg_color = "#28a745"
+        elif self.data['status'] == '未标注': pg_color = "#dc3545"
+
+        self.progress.setStyleSheet(f"""
+            QProgressBar {{ border: none; background-color: #f0f2f5; border-radius: 3px; }} 
+            QProgressBar::chunk {{ background-color: {pg_color}; border-radius: 3px; }}
+        """)
+        self.status_lbl.setText(self.data['status'])
+        self.status_lbl.setStyleSheet(f"color: {self.data['status_color']}; font-weight: 600; font-size: 13px; border: none; background: transparent;")
 
     def on_export_btn_clicked(self):
         """点击导出按钮时，只触发导出，不触发进入项目"""
         self.export_clicked.emit(self.data['object'])
 
+    def on_sync_toggled(self, checked):
+        self.sync_toggled.emit(self.data['object'], checked)
+
+    def on_validate_btn_clicked(self):
+        self.validate_clicked.emit(self.data['object'])
+
     def on_delete_btn_clicked(self):
         """点击删除按钮时，只触发删除，不触发进入项目"""
         self.delete_clicked.emit(self.data['object'])
 
+    # === 右键菜单：不常用的操作 ===
+    def contextMenuEvent(self, event):
+        menu = QMenu(self)
+        action_relocate = menu.addAction("重新定位源文件夹...")
+        action_relocate.setToolTip("源文件夹被移动或改名后，指向新位置（标注保留）")
+        if menu.exec(event.globalPos()) is action_relocate:
+            self.relocate_clicked.emit(self.data['object'])
+
     # === 点击卡片任意位置进入项目（按钮点击不会触发这里） ===
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
@@ -156,8 +215,17 @@ class TaskListInterface(QWidget):
 
     def __init__(self, parent=None):
         super().__init__(parent)
+        self.cards = {}  # project_id -> TaskCard
         self.initUI()
 
+        # 数据变更事件：只增删/更新受影响的卡片
+        event_bus.project_created.connect(self.on_project_created)
+        event_bus.project_deleted.connect(self.on_project_deleted)
+        event_bus.project_updated.connect(self.update_card)
+        event_bus.media_added.connect(self.on_media_added)
+        event_bus.image_labeled.connect(self.on_image_labeled)
+        event_bus.stats_rebuilt.connect(self.refresh_data)
+
     def initUI(self):
         main_layout = QVBoxLayout(self)
         main_layout.setContentsMargins(20, 20, 20, 20)
@@ -201,21 +269,58 @@ class TaskListInterface(QWidget):
         main_layout.addWidget(scroll)
 
     def refresh_data(self):
+        """全量重建（首次加载 / 计数器重建后）；日常变更走事件局部更新"""
         while self.flow_layout.count():
             item = self.flow_layout.takeAt(0)
             widget = item.widget()
             if widget: widget.deleteLater()
+        self.cards.clear()
 
         projects = DataManager.get_all_projects_stats()
         if not projects: return
 
         for p_data in projects:
-            card = TaskCard(p_data)
-            # 连接信号
-            card.enter_clicked.connect(self.on_project_clicked)
-            card.export_clicked.connect(self.on_export_clicked)
-            card.delete_clicked.connect(self.on_delete_clicked)
-            self.flow_layout.addWidget(card)
+            self.flow_layout.addWidget(self.create_card(p_data))
+
+    def create_card(self, p_data):
+        card = TaskCard(p_data)
+        # 连接信号
+        card.enter_clicked.connect(self.on_project_clicked)
+        card.export_clicked.connect(self.on_export_clicked)
+        card.delete_clicked.connect(self.on_delete_clicked)
+        card.sync_toggled.connect(self.on_sync_toggled)
+        card.validate_clicked.connect(self.on_validate_clicked)
+        card.relocate_clicked.connect(self.on_relocate_clicked)
+        self.cards[p_data['id']] = card
+        return card
+
+    def on_project_created(self, project_id):
+        p_data = DataManager.get_project_stats(project_id)
+        if p_data is None or project_id in self.cards:
+            return
+        # 列表按创建时间倒序，新项目放在最前
+        self.flow_layout.insertWidget(0, self.create_card(p_data))
+
+    def on_project_deleted(self, project_id):
+        card = self.cards.pop(project_id, None)
+        if card is None:
+            return
+        self.flow_layout.removeWidget(card)
+        card.deleteLater()
+
+    def on_media_added(self, project_id, count):
+        self.update_card(project_id)
+
+    def on_image_labeled(self, project_id, media_id, labeled):
+        self.update_card(project_id)
+
+    def update_card(self, project_id):
+        card = self.cards.get(project_id)
+        if card is None:
+            return
+        p_data = DataManager.get_project_stats(project_id)
+        if p_data is not None:
+            card.update_data(p_data)
 
     def open_new_task_dialog(self):
         dialog = NewProjectDialog(self)
@@ -227,11 +332,78 @@ class TaskListInterface(QWidget):
     def on_project_clicked(self, project_obj):
         self.project_selected.emit(project_obj)
 
+    def on_sync_toggled(self, project_obj, enabled):
+        # 写入后发布 project_updated：FolderSyncService 随之启停监听，卡片同步刷新
+        get_db_writer().submit(DataManager.update_project, project_obj.id, auto_sync=enabled,
+                               key=("auto_sync", project_obj.id))
+
+    def on_validate_clicked(self, project_obj):
+        # 后台进程池完整解码，可取消（已校验的结果保留，下次从剩余的图片继续）
+        self.validate_dialog = QProgressDialog("正在校验图片...", "停止", 0, 0, self)
+        self.validate_dialog.setWindowTitle("校验图片")
+        self.validate_dialog.setWindowModality(Qt.WindowModal)
+        self.validate_dialog.setMinimumDuration(0)
+        self.validate_dialog.setAutoClose(False)
+        self.validate_dialog.setAutoReset(False)
+        self.validate_dialog.show()
+
+        self.validate_worker = ValidateMediaWorker(project_obj.id)
+        self.validate_worker.progress_signal.connect(self.on_validate_progress)
+        self.validate_worker.finished_signal.connect(self.on_validate_finished)
+        self.validate_dialog.canceled.connect(self.validate_worker.stop)
+        self.validate_worker.start()
+
+    def on_validate_progress(self, done, total, text):
+        self.validate_dialog.setMaximum(total)
+        self.validate_dialog.setValue(done)
+        self.validate_dialog.setLabelText(text)
+
+    def on_validate_finished(self, result):
+        self.validate_dialog.canceled.disconnect(self.validate_worker.stop)
+        self.validate_dialog.close()
+
+        if not result.get("ok"):
+            QMessageBox.critical(self, "校验失败", result.get("error") or "未知错误")
+            return
+        text = (f"本次校验 {result['checked']} 张图片，耗时 {result['seconds']:.1f} 秒"
+                f"（{result['rate']:.0f} 张/秒）\n"
+                f"新发现损坏 / 截断：{result['broken']} 张；项目中共 {result['total_broken']} 张，"
+                f"已从标注与导出中排除。")
+        if result.get("cancelled"):
+            text = "校验已停止，下次将从未校验的图片继续。\n\n" + text
+        done = QMessageBox(self)
+        done.setWindowTitle("校验完成")
+        done.setText(text)
+        done.setStyleSheet("QMessageBox { background-color: white; color: #333; } QLabel { color: #333; }")
+        done.exec()
+
+    def on_relocate_clicked(self, project_obj):
+        old_path = project_obj.path
+        if os.path.splitext(old_path)[1].lower() in SUPPORTED_VIDEO_EXT:
+            filt = "Videos (" + " ".join(f"*{ext}" for ext in SUPPORTED_VIDEO_EXT) + ")"
+            new_path, _ = QFileDialog.getOpenFileName(self, "选择视频的新位置", os.path.dirname(old_path), filt)
+        else:
+            new_path = QFileDialog.getExistingDirectory(self, "选择源文件夹的新位置", os.path.dirname(old_path))
+        if not new_path:
+            return
+        try:
+            result = get_db_writer().call(DataManager.relocate_project, project_obj.id, new_path)
+        except Exception as e:
+            QMessageBox.critical(self, "重定位失败", str(e))
+            return
+        project_obj.path = result['path']
+        text = f"已将 {result['dirs']} 个目录指向新位置：\n{result['path']}"
+        if result['conflicts']:
+            text += f"\n\n新位置已有同名图片记录，{result['conflicts']} 张旧记录未移动（保留在原目录下）。"
+        QMessageBox.information(self, "重定位完成", text)
+
     def on_export_clicked(self, project_obj):
         dialog = ExportDialog(self)
         if dialog.exec():
             data = dialog.get_data()
             try:
+                # 导出前等待后台写线程写完所有标注
+                get_db_writer().flush()
                 count = DataManager.export_dataset(project_obj, data['path'], data['format'])
                 
                 # === 修复：使用白色背景的提示框 ===
@@ -271,14 +443,36 @@ class TaskListInterface(QWidget):
         if ret != QMessageBox.Yes:
             return
 
-        result = DataManager.delete_project(project_obj, delete_managed_files=False, delete_original_files=False)
+        # 后台分批删除（大项目可能耗时较长），可取消
+        self.delete_dialog = QProgressDialog("正在删除任务...", "取消", 0, 100, self)
+        self.delete_dialog.setWindowTitle("删除任务")
+        self.delete_dialog.setWindowModality(Qt.WindowModal)
+        self.delete_dialog.setMinimumDuration(0)
+        self.delete_dialog.setAutoClose(False)
+        self.delete_dialog.setAutoReset(False)
+        self.delete_dialog.show()
+
+        self.delete_worker = DeleteProjectWorker(project_obj.id, delete_managed_files=False, delete_original_files=False)
+        self.delete_worker.progress_signal.connect(self.on_delete_progress)
+        self.delete_worker.finished_signal.connect(self.on_delete_finished)
+        self.delete_dialog.canceled.connect(self.delete_worker.stop)
+        self.delete_worker.start()
+
+    def on_delete_progress(self, value, text):
+        self.delete_dialog.setValue(value)
+        self.delete_dialog.setLabelText(text)
+
+    def on_delete_finished(self, result):
+        self.delete_dialog.canceled.disconnect(self.delete_worker.stop)
+        self.delete_dialog.close()
+
+        if result.get("cancelled"):
+            QMessageBox.information(self, "已取消", "删除已取消，任务数据未做任何改动。")
+            return
         if not result.get("ok"):
             QMessageBox.critical(self, "删除失败", result.get("error") or "未知错误")
             return
 
-        # 刷新任务列表
-        self.refresh_data()
-
         done = QMessageBox(self)
         done.setWindowTitle("删除成功")
         deleted = result.get("deleted", {})
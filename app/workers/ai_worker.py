@@ -23,16 +23,13 @@ class AiWorker(QThread):
         # backend 是已加载的推理后端（支持不同格式/框架）
         self.backend = None
 
-    def update_config(self, model_path, target_classes_str):
-        """动态更新配置"""
+    def update_config(self, model_path, target_classes):
+        """动态更新配置（target_classes：项目类别名列表，为空则不过滤）"""
         if model_path and model_path != self.model_path:
             self.model_path = model_path
             self.backend = None  # 强制重新加载
 
-        if target_classes_str:
-            self.target_classes = [c.strip() for c in target_classes_str.split(',') if c.strip()]
-        else:
-            self.target_classes = None
+        self.target_classes = list(target_classes) if target_classes else None
 
     def set_image(self, image_path):
         self.image_path = image_path
@@ -0,0 +1,54 @@
+import threading
+from PySide6.QtCore import QThread, Signal
+from app.common.logger import logger
+from app.services.data_manager import DataManager
+from app.services.db_writer import get_db_writer
+
+class DeleteProjectWorker(QThread):
+    """后台删除项目：数据库记录在写线程中分批删除（可取消，取消则整体回滚），
+    提交后再并行清理托管文件"""
+    progress_signal = Signal(int, str)  # 进度(0-100), 当前状态信息
+    finished_signal = Signal(object)    # 完成信号，返回 DataManager.delete_project 的结果
+
+    def __init__(self, project_id, delete_managed_files=False, delete_original_files=False):
+        super().__init__()
+        self.project_id = project_id
+        self.delete_managed_files = delete_managed_files
+        self.delete_original_files = delete_original_files
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        def on_db_progress(done, total):
+            progress = int(done / total * 90) if total else 90
+            self.progress_signal.emit(progress, f"正在删除数据库记录: {done} / {total}")
+
+        def on_file_progress(done, total):
+            self.progress_signal.emit(90 + int(done / total * 10), f"正在清理文件: {done} / {total}")
+
+        try:
+            result = get_db_writer().call(
+                DataManager.delete_project, self.project_id,
+                delete_managed_files=self.delete_managed_files,
+                delete_original_files=self.delete_original_files,
+                progress_cb=on_db_progress,
+                cancel_event=self.cancel_event,
+                defer_file_cleanup=True)
+        except Exception as e:
+            logger.exception("删除项目失败")
+            result = {"ok": False, "cancelled": False, "deleted": {}, "files_pending": [], "dirs_pending": [],
+                      "error": str(e)}
+
+        # 数据库已提交，文件清理不再响应取消
+        pending = result.pop("files_pending", [])
+        pending_dirs = result.pop("dirs_pending", [])
+        if result.get("ok") and pending:
+            result["deleted"]["files"] = DataManager.remove_files(pending, progress_cb=on_file_progress)
+        if result.get("ok") and pending_dirs:
+            DataManager.remove_empty_dirs(pending_dirs)
+
+        if result.get("ok"):
+            logger.info(f"项目 {self.project_id} 删除完成: {result['deleted']}")
+        self.finished_signal.emit(result)
+
+    def stop(self):
+        self.cancel_event.set()
@@ -0,0 +1,103 @@
+import threading
+import time
+from PySide6.QtCore import QThread, Signal
+from app.common.logger import logger
+from app.services.data_manager import DataManager
+from app.services.db_writer import get_db_writer
+from app.services.image_probe import probe_pending_media
+
+class ImportProjectWorker(QThread):
+    """后台导入文件夹，分两个阶段：
+    1. 扫描与入库：在本线程扫描，改动按批交给写线程（可取消：新建的项目整体删除，已有项目保留已同步的目录）
+    2. 探测图片头信息并计算内容哈希：线程池并行读取，结果分批写回；项目开启感知哈希时改由进程池
+       同时计算 dHash；开启查重时完成后汇总重复图片
+    界面线程只接收分阶段的进度与吞吐量"""
+    progress_signal = Signal(int, int, str)  # 已完成数, 总数（0 表示未知）, 当前状态信息
+    finished_signal = Signal(object)         # 完成信号，返回导入结果（见 run）
+
+    def __init__(self, path, model_path=None, class_names=None, project_name=None,
+                 dedup_mode=None, dedup_similar=None):
+        super().__init__()
+        self.path = path
+        self.model_path = model_path
+        self.class_names = class_names
+        self.project_name = project_name
+        self.dedup_mode = dedup_mode
+        self.dedup_similar = dedup_similar
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        """结果：
+        {
+            "ok": bool, "cancelled": bool, "error": str | None,
+            "new_project": 是否新建项目（取消时据此区分：新建的已删除 / 已有项目保留已同步的部分）,
+            "project": Project | None, "videos": [str], "total": 项目图片总数,
+            "found": 本次扫描到的图片数, "seconds": 扫描入库耗时, "rate": 文件/秒,
+            "probed": 探测了头信息的图片数,
+            "duplicates": 查重汇总（DataManager.get_duplicate_summary；未开启查重时为 None）
+        }
+        """
+        result = {"ok": False, "cancelled": False, "error": None,
+                  "new_project": DataManager.find_project(self.path) is None,
+                  "project": None, "videos": [], "total": 0, "found": 0, "seconds": 0.0, "rate": 0.0, "probed": 0,
+                  "duplicates": None}
+        start = time.perf_counter()
+
+        def on_scan_progress(found, rate):
+            result["found"] = found
+            self.progress_signal.emit(found, 0, f"正在扫描并写入：已发现 {found} 张图片（{rate:.0f} 文件/秒）")
+
+        # 创建项目的命令排在写线程队列中，先提示等待
+        self.progress_signal.emit(0, 0, "正在准备导入...")
+        try:
+            imported = DataManager.import_folder(
+                self.path,
+                model_path=self.model_path,
+                class_names=self.class_names,
+                project_name=self.project_name,
+                progress_cb=on_scan_progress,
+                cancel_event=self.cancel_event,
+                dedup_mode=self.dedup_mode,
+                dedup_similar=self.dedup_similar)
+        except Exception as e:
+            logger.exception("导入文件夹失败")
+            result["error"] = str(e)
+            self.finished_signal.emit(result)
+            return
+
+        result["seconds"] = time.perf_counter() - start
+        if imported is None:
+            result["cancelled"] = True
+            result["error"] = "已取消导入"
+        else:
+            result["project"], result["videos"], result["total"] = imported
+            result["rate"] = result["found"] / result["seconds"] if result["seconds"] > 0 else 0.0
+            result["ok"] = True
+            logger.info(f"导入 {self.path} 完成：扫描 {result['found']} 张图片，项目共 {result['total']} 张，"
+                        f"耗时 {result['seconds']:.2f} s（{result['rate']:.0f} 文件/秒）")
+
+            # 第二阶段：只读文件头探测宽高等信息（导入已提交；此时取消只是停止探测，剩余的下次继续）
+            probe_start = time.perf_counter()
+            dedup_mode, with_phash = DataManager.get_dedup_settings(result["project"].id)
+            with_phash = with_phash and dedup_mode != 'off'
+            stage = "读取图片信息并计算内容 / 感知哈希" if with_phash else "读取图片信息并计算内容哈希"
+
+            def on_probe_progress(done, total):
+                cost = time.perf_counter() - probe_start
+                rate = done / cost if cost > 0 else 0.0
+                self.progress_signal.emit(done, total, f"正在{stage}：{done} / {total}（{rate:.0f} 张/秒）")
+
+            try:
+                result["probed"] = probe_pending_media(result["project"].id, progress_cb=on_probe_progress,
+                                                       cancel_event=self.cancel_event)
+                if dedup_mode != 'off':
+                    get_db_writer().flush()
+                    result["duplicates"] = DataManager.get_duplicate_summary(result["project"].id)
+                    # skip 模式下跳过的重复图片不计入项目图片数
+                    result["total"] = DataManager.get_project_stats(result["project"].id)['total']
+            except Exception:
+                logger.exception("图片信息探测失败")
+        self.finished_signal.emit(result)
+
+    def stop(self):
+        self.cancel_event.set()
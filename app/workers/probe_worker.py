@@ -0,0 +1,26 @@
+import threading
+from PySide6.QtCore import QThread, Signal
+from app.common.logger import logger
+from app.services.image_probe import probe_pending_media
+
+class ProbeMediaWorker(QThread):
+    """后台探测项目中待探测图片的头信息（宽高 / 格式 / 通道数；项目开启查重时一并计算内容哈希），可中断，下次继续"""
+    progress_signal = Signal(int, int)  # 已探测数, 待探测总数
+    finished_signal = Signal(int, int)  # project_id, 本次探测的图片数
+
+    def __init__(self, project_id):
+        super().__init__()
+        self.project_id = project_id
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        try:
+            count = probe_pending_media(self.project_id, progress_cb=self.progress_signal.emit,
+                                        cancel_event=self.cancel_event)
+        except Exception:
+            logger.exception(f"项目 {self.project_id} 图片信息探测失败")
+            count = 0
+        self.finished_signal.emit(self.project_id, count)
+
+    def stop(self):
+        self.cancel_event.set()
@@ -0,0 +1,40 @@
+import threading
+from PySide6.QtCore import QThread, Signal
+from app.common.logger import logger
+from app.services.data_manager import DataManager
+from app.services.image_validate import validate_pending_media
+
+class ValidateMediaWorker(QThread):
+    """后台完整解码校验项目图片（进程池），标记损坏 / 截断的文件；可取消，下次从未校验的图片继续"""
+    progress_signal = Signal(int, int, str)  # 已校验数, 待校验总数, 当前状态信息
+    finished_signal = Signal(object)         # 完成信号，返回结果（见 run）
+
+    def __init__(self, project_id):
+        super().__init__()
+        self.project_id = project_id
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        """结果：{"ok", "cancelled", "error", "checked", "broken", "seconds", "rate", "total_broken"}"""
+        result = {"ok": False, "cancelled": False, "error": None,
+                  "checked": 0, "broken": 0, "seconds": 0.0, "rate": 0.0, "total_broken": 0}
+
+        def on_progress(done, total, rate):
+            self.progress_signal.emit(done, total, f"正在校验图片：{done} / {total}（{rate:.0f} 张/秒）")
+
+        self.progress_signal.emit(0, 0, "正在准备校验...")
+        try:
+            result.update(validate_pending_media(self.project_id, progress_cb=on_progress,
+                                                 cancel_event=self.cancel_event))
+            result["total_broken"] = len(DataManager.get_broken_media(self.project_id))
+            result["cancelled"] = self.cancel_event.is_set()
+            result["ok"] = True
+            logger.info(f"项目 {self.project_id} 校验 {result['checked']} 张图片，新发现损坏 {result['broken']} 张，"
+                        f"耗时 {result['seconds']:.2f} s（{result['rate']:.0f} 张/秒）")
+        except Exception as e:
+            logger.exception(f"项目 {self.project_id} 图片校验失败")
+            result["error"] = str(e)
+        self.finished_signal.emit(result)
+
+    def stop(self):
+        self.cancel_event.set()
@@ -1,56 +1,122 @@
-import cv2
-import os
+import queue
+import threading
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
 from PySide6.QtCore import QThread, Signal
+from app.common.config import VIDEO_SAMPLING, FRAME_ENCODE_THREADS
 from app.common.logger import logger
+from app.services.data_manager import DataManager
+from app.services.db_writer import get_db_writer
+from app.services.frame_extractor import video_pool_size, create_video_pool, submit_video
 
-class VideoExtractWorker(QThread):
-    progress_signal = Signal(int, str)  # 进度(0-100), 当前状态信息
-    finished_signal = Signal(int)       # 完成信号，返回生成的图片数量
+class VideoBatchExtractWorker(QThread):
+    """多个视频并行抽帧：分发到进程池（见 frame_extractor.create_video_pool），
+    每个视频完成后立即把帧登记到项目（写线程），界面接收总体与单个视频的进度"""
+    progress_signal = Signal(int, str)            # 总体进度(0-100), 当前状态信息
+    video_progress_signal = Signal(int, int, str)  # 视频序号, 该视频进度(0-100), 状态信息
+    video_finished_signal = Signal(int, int)       # 视频序号, 该视频抽取的帧数（-1 表示无法打开或失败）
+    finished_signal = Signal(object)               # 完成信号，返回结果（见 run）
 
-    def __init__(self, video_path, output_dir, fps=2):
+    def __init__(self, project_id, video_paths, output_root, fps=2, strategy=VIDEO_SAMPLING):
         super().__init__()
-        self.video_path = video_path
-        self.output_dir = output_dir
+        self.project_id = project_id
+        self.video_paths = list(video_paths)
+        self.output_root = output_root
         self.fps = fps
-        self.is_running = True
+        self.strategy = strategy
+        self.cancel_event = threading.Event()
 
     def run(self):
-        cap = cv2.VideoCapture(self.video_path)
-        if not cap.isOpened():
-            self.progress_signal.emit(0, "无法打开视频文件")
-            return
-
-        original_fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        
-        # 计算跳帧间隔：例如原视频30帧，目标2帧，则每15帧取1个
-        step = int(original_fps / self.fps) if self.fps > 0 else 30
-        
-        count = 0
-        saved_count = 0
-        
-        os.makedirs(self.output_dir, exist_ok=True)
-
-        while self.is_running:
-            ret, frame = cap.read()
-            if not ret:
+        """结果：
+        {
+            "ok": bool, "cancelled": bool,
+            "videos": [{"path", "frames": 帧数（失败为 None）, "added": 新登记到项目的图片数（已登记过的帧不计）,
+                        "reused": 复用已有的帧,
+                        "dropped": 丢弃的重复帧数, "dir": 帧目录, "error"}],
+            "frames": 总帧数, "dropped": 总丢弃帧数, "seconds": 耗时
+        }
+        """
+        start = time.perf_counter()
+        count = len(self.video_paths)
+        videos = [{"path": p, "frames": None, "added": 0, "reused": False, "dropped": 0, "dir": None, "error": None}
+                  for p in self.video_paths]
+        progress = [0] * count
+        result = {"ok": False, "cancelled": False, "videos": videos, "frames": 0, "dropped": 0, "seconds": 0.0}
+        writer = get_db_writer()
+        registered = []
+
+        processes, decode_threads = video_pool_size(count)
+        pool, progress_queue, pool_cancel = create_video_pool(processes)
+        logger.info(f"并行抽帧：{count} 个视频，{processes} 个进程，每个进程 {decode_threads} 个解码线程、"
+                    f"{FRAME_ENCODE_THREADS} 个编码线程")
+        try:
+            futures = {submit_video(pool, i, path, self.output_root, fps=self.fps, strategy=self.strategy,
+                                    decode_threads=decode_threads): i
+                       for i, path in enumerate(self.video_paths)}
+            pending = set(futures)
+            while pending:
+                if self.cancel_event.is_set():
+                    pool_cancel.set()
+                    for f in pending:
+                        f.cancel()
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                self._drain_progress(progress_queue, progress)
+                for f in done:
+                    i = futures[f]
+                    try:
+                        manifest = None if f.cancelled() else f.result()
+                    except Exception as e:
+                        logger.exception(f"视频抽帧失败：{self.video_paths[i]}")
+                        videos[i]["error"] = str(e)
+                        manifest = None
+                    if manifest is None and not videos[i]["error"] and not f.cancelled():
+                        videos[i]["error"] = "无法打开视频文件"
+                    frames = len(manifest["frames"]) if manifest is not None else None
+                    videos[i].update(frames=frames, dropped=manifest.get("dropped", 0) if manifest is not None else 0)
+                    progress[i] = 100
+                    # 取消时中途停下的视频（清单不完整）不登记
+                    if frames and manifest["complete"]:
+                        videos[i].update(reused=manifest.get("reused", False), dir=manifest["dir"])
+                        registered.append((i, writer.submit(DataManager.add_frames, self.project_id,
+                                                            manifest["dir"])))
+                    self.video_finished_signal.emit(i, -1 if frames is None else frames)
+                    self._emit_total(progress)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            progress_queue.close()
+
+        for i, future in registered:
+            try:
+                videos[i]["added"] = future.result()
+            except Exception as e:
+                logger.exception(f"登记视频帧失败：{self.video_paths[i]}")
+                videos[i]["error"] = str(e)
+        result["frames"] = sum(v["frames"] or 0 for v in videos)
+        result["dropped"] = sum(v["dropped"] for v in videos)
+        result["seconds"] = time.perf_counter() - start
+        result["cancelled"] = self.cancel_event.is_set()
+        result["ok"] = not result["cancelled"]
+        logger.info(f"并行抽帧完成：{count} 个视频共 {result['frames']} 帧（丢弃重复帧 {result['dropped']}），"
+                    f"耗时 {result['seconds']:.1f} s")
+        self.finished_signal.emit(result)
+
+    def _drain_progress(self, progress_queue, progress):
+        changed = False
+        while True:
+            try:
+                i, value, text = progress_queue.get_nowait()
+            except queue.Empty:
                 break
-            
-            if count % step == 0:
-                frame_name = f"frame_{saved_count:06d}.jpg"
-                save_path = os.path.join(self.output_dir, frame_name)
-                cv2.imwrite(save_path, frame)
-                saved_count += 1
-                
-                # 发送进度
-                progress = int((count / total_frames) * 100)
-                self.progress_signal.emit(progress, f"正在导出: {frame_name}")
-
-            count += 1
-
-        cap.release()
-        self.finished_signal.emit(saved_count)
-        logger.info(f"视频处理完成，共抽取 {saved_count} 帧")
+            progress[i] = value
+            changed = True
+            self.video_progress_signal.emit(i, value, text)
+        if changed:
+            self._emit_total(progress)
+
+    def _emit_total(self, progress):
+        finished = sum(1 for v in progress if v >= 100)
+        total = sum(progress) // len(progress)
+        self.progress_signal.emit(total, f"正在抽帧：已完成 {finished} / {len(progress)} 个视频")
 
     def stop(self):
-        self.is_running = False
\ No newline at end of file
+        self.cancel_event.set()
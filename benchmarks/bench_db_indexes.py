@@ -0,0 +1,151 @@
+"""
+索引迁移前后的查询耗时对比（before/after timing report）
+
+用法（在仓库根目录）：
+    python -m benchmarks.bench_db_indexes --media 400000
+
+在临时目录中按旧版结构（无索引）生成一个模拟库，测量切图/统计的热点查询，
+再执行 run_migrations() 升级到最新结构后重复测量。
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from app.models.schema import db, ALL_MODELS
+from app.models.migrations import run_migrations
+
+# 与最初版本 init_db() 建出的表结构一致（仅外键索引）
+LEGACY_DDL = [
+    'CREATE TABLE "project" ("id" INTEGER NOT NULL PRIMARY KEY, "name" VARCHAR(255) NOT NULL, '
+    '"path" VARCHAR(255) NOT NULL, "description" TEXT, "model_path" VARCHAR(255), "classes" TEXT, '
+    '"created_at" DATETIME NOT NULL)',
+    'CREATE UNIQUE INDEX "project_path" ON "project" ("path")',
+    'CREATE TABLE "mediaitem" ("id" INTEGER NOT NULL PRIMARY KEY, "project_id" INTEGER NOT NULL, '
+    '"file_path" VARCHAR(255) NOT NULL, "media_type" VARCHAR(255) NOT NULL, "is_labeled" INTEGER NOT NULL, '
+    '"created_at" DATETIME NOT NULL, FOREIGN KEY ("project_id") REFERENCES "project" ("id"))',
+    'CREATE INDEX "mediaitem_project_id" ON "mediaitem" ("project_id")',
+    'CREATE TABLE "annotation" ("id" INTEGER NOT NULL PRIMARY KEY, "media_item_id" INTEGER NOT NULL, '
+    '"label" VARCHAR(255) NOT NULL, "x" REAL NOT NULL, "y" REAL NOT NULL, "w" REAL NOT NULL, "h" REAL NOT NULL, '
+    '"shape_type" VARCHAR(255) NOT NULL, "points" TEXT, "confidence" REAL NOT NULL, "created_at" DATETIME NOT NULL, '
+    'FOREIGN KEY ("media_item_id") REFERENCES "mediaitem" ("id"))',
+    'CREATE INDEX "annotation_media_item_id" ON "annotation" ("media_item_id")',
+]
+
+
+def build_legacy_db(n_projects, n_media, ann_per_labeled):
+    for sql in LEGACY_DDL:
+        db.execute_sql(sql)
+
+    now = "2024-01-01 00:00:00"
+    with db.atomic():
+        for p in range(1, n_projects + 1):
+            db.execute_sql(
+                'INSERT INTO project (id, name, path, classes, created_at) VALUES (?, ?, ?, ?, ?)',
+                (p, f"project_{p}", f"/data/project_{p}", "person,car", now))
+
+        rows = []
+        for i in range(1, n_media + 1):
+            p = (i % n_projects) + 1
+            rows.append((i, p, f"/data/project_{p}/images/img_{i:08d}.jpg", "image", int(i % 3 == 0), now))
+        db.cursor().executemany(
+            'INSERT INTO mediaitem (id, project_id, file_path, media_type, is_labeled, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+        anns = []
+        for i in range(3, n_media + 1, 3):
+            for _ in range(ann_per_labeled):
+                anns.append((i, "person", 0.5, 0.5, 0.1, 0.1, "rect", 1.0, now))
+        db.cursor().executemany(
+            'INSERT INTO annotation (media_item_id, label, x, y, w, h, shape_type, confidence, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', anns)
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def measure(n_projects, n_media, repeat, interned=False):
+    """interned=True：迁移后的结构（directory 表 + 文件名列）"""
+    rnd = random.Random(42)
+    sample_ids = [rnd.randint(1, n_media) for _ in range(repeat)]
+
+    def path_of(i):
+        p = (i % n_projects) + 1
+        return f"/data/project_{p}/images/img_{i:08d}.jpg"
+
+    it = iter(sample_ids * 4)
+
+    def lookup_by_path():
+        # save_annotations / load_annotations_from_db
+        path = path_of(next(it))
+        if not interned:
+            db.execute_sql("SELECT id FROM mediaitem WHERE file_path = ?", (path,)).fetchone()
+            return
+        dir_path, name = os.path.split(path)
+        row = db.execute_sql("SELECT id FROM directory WHERE path = ?", (dir_path,)).fetchone()
+        db.execute_sql("SELECT id FROM mediaitem WHERE directory_id = ? AND name = ?", (row[0], name)).fetchone()
+
+    def project_stats():
+        # get_all_projects_stats
+        for p in range(1, n_projects + 1):
+            db.execute_sql("SELECT COUNT(*) FROM mediaitem WHERE project_id = ?", (p,)).fetchone()
+            db.execute_sql("SELECT COUNT(*) FROM mediaitem WHERE project_id = ? AND is_labeled = 1", (p,)).fetchone()
+
+    def first_unlabeled():
+        # enter_labeling_mode
+        if not interned:
+            db.execute_sql(
+                "SELECT file_path FROM mediaitem WHERE project_id = ? AND is_labeled = 0 ORDER BY file_path LIMIT 1",
+                (1,)).fetchone()
+            return
+        db.execute_sql(
+            "SELECT directory_id, name FROM mediaitem WHERE project_id = ? AND is_labeled = 0 "
+            "ORDER BY directory_id, name LIMIT 1", (1,)).fetchone()
+
+    def load_annotations():
+        i = next(it)
+        db.execute_sql("SELECT * FROM annotation WHERE media_item_id = ?", (i,)).fetchall()
+
+    return [
+        ("按路径查找 MediaItem", timed(lookup_by_path, repeat)),
+        ("加载单图标注", timed(load_annotations, repeat)),
+        (f"项目统计 ({n_projects} 个项目)", timed(project_stats, max(1, repeat // 10))),
+        ("第一张未标注", timed(first_unlabeled, max(1, repeat // 10))),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--projects", type=int, default=4)
+    parser.add_argument("--media", type=int, default=100000)
+    parser.add_argument("--annotations", type=int, default=3, help="每张已标注图片的标注数")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.init(os.path.join(tmp, "bench.db"))
+        db.connect()
+        build_legacy_db(args.projects, args.media, args.annotations)
+
+        before = measure(args.projects, args.media, args.repeat)
+        report = run_migrations(db, ALL_MODELS)
+        after = measure(args.projects, args.media, args.repeat, interned=True)
+        db.close()
+
+    print(f"\n模拟数据：{args.projects} 个项目 / {args.media} 张图片")
+    for version, description, cost in report:
+        print(f"迁移 v{version} {description}: {cost * 1000:.1f} ms")
+    print(f"\n{'查询':<28}{'迁移前(ms)':>12}{'迁移后(ms)':>12}{'加速':>10}")
+    for (name, t0), (_, t1) in zip(before, after):
+        speedup = t0 / t1 if t1 > 0 else float("inf")
+        print(f"{name:<28}{t0:>12.3f}{t1:>12.3f}{speedup:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
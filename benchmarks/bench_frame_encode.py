@@ -0,0 +1,71 @@
+"""
+视频抽帧编码对比：解码线程中逐帧编码（原循环） vs 解码 -> 有界队列 -> 编码线程池
+
+用法（在仓库根目录）：
+    python -m benchmarks.bench_frame_encode --video path/to/long_4k.mp4 --fps 5
+    python -m benchmarks.bench_frame_encode --width 3840 --height 2160 --seconds 10 --threads 0 1 2 4
+
+未指定 --video 时先生成一段合成视频（见 bench_frame_sampling.make_video）。
+每种保存格式分别以不同的编码线程数完整执行 extract_frames（每次写入新的临时目录，不复用已有帧），
+输出耗时、输出帧/秒、相对逐帧编码的加速比与平均文件大小。
+编码线程与解码共用 CPU，单核机器上看不到加速。
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import cv2
+
+from app.services.frame_extractor import FRAME_FORMATS, extract_frames
+from benchmarks.bench_frame_sampling import make_video
+
+
+def run(video, fps, image_format, quality, threads):
+    with tempfile.TemporaryDirectory() as out:
+        start = time.perf_counter()
+        manifest = extract_frames(video, out, fps=fps, image_format=image_format, quality=quality,
+                                  encode_threads=threads)
+        seconds = time.perf_counter() - start
+        sizes = [os.path.getsize(os.path.join(manifest["dir"], f["file"])) for f in manifest["frames"]]
+    return seconds, len(sizes), sum(sizes) / len(sizes) if sizes else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="测试视频（默认生成合成视频）")
+    parser.add_argument("--width", type=int, default=3840)
+    parser.add_argument("--height", type=int, default=2160)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--fps", type=float, default=5, help="目标抽帧帧率")
+    parser.add_argument("--formats", nargs="+", default=list(FRAME_FORMATS), choices=list(FRAME_FORMATS))
+    parser.add_argument("--quality", type=int, default=90)
+    parser.add_argument("--threads", type=int, nargs="+", default=[0, 1, 2, 4], help="编码线程数（0 为逐帧编码）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video = args.video
+        if not video:
+            video = os.path.join(tmp, "bench.mp4")
+            print(f"生成合成视频 {args.width}x{args.height}，{args.seconds:.0f} 秒 ...")
+            make_video(video, args.width, args.height, args.seconds)
+
+        cap = cv2.VideoCapture(video)
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        cap.release()
+
+        print(f"\n视频 {size[0]}x{size[1]}，抽帧 {args.fps:g} 帧/秒，CPU 核数 {os.cpu_count()}")
+        print(f"{'格式':<6}{'编码线程':>8}{'耗时(s)':>10}{'输出帧/秒':>11}{'加速':>8}{'输出帧':>8}{'平均大小(KB)':>14}")
+        for image_format in args.formats:
+            baseline = None
+            for threads in args.threads:
+                seconds, count, avg_size = run(video, args.fps, image_format, args.quality, threads)
+                if baseline is None:
+                    baseline = seconds
+                print(f"{image_format:<6}{threads:>8}{seconds:>10.2f}{count / seconds:>11.1f}"
+                      f"{baseline / seconds:>7.2f}x{count:>8}{avg_size / 1024:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
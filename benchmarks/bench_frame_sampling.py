@@ -0,0 +1,85 @@
+"""
+视频抽帧读取方式对比：read（逐帧解码） vs grab + retrieve vs seek（按帧号定位）
+
+用法（在仓库根目录）：
+    python -m benchmarks.bench_frame_sampling --video path/to/long_4k.mp4 --fps 2 0.5 0.1
+    python -m benchmarks.bench_frame_sampling --width 3840 --height 2160 --seconds 20
+
+未指定 --video 时先用 cv2.VideoWriter 生成一段合成视频（mp4v 编码）。
+只测量采样读取（不写图片），输出各方式的耗时、源视频帧/秒与输出帧/秒，
+并核对 grab / seek 取到的帧与 read 是否一致。
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from app.services.frame_extractor import frame_step, choose_strategy, iter_frames
+
+
+def make_video(path, width, height, seconds, fps=30):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    rng = np.random.default_rng(0)
+    base = cv2.resize(rng.integers(0, 255, (height // 8, width // 8, 3), dtype=np.uint8), (width, height))
+    for i in range(int(seconds * fps)):
+        frame = np.roll(base, i * 8, axis=1)
+        cv2.putText(frame, str(i), (50, height // 2), cv2.FONT_HERSHEY_SIMPLEX, 8, (255, 255, 255), 16)
+        writer.write(frame)
+    writer.release()
+
+
+def run(video, step, strategy):
+    cap = cv2.VideoCapture(video)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    start = time.perf_counter()
+    frames = {index: cv2.resize(frame, (64, 36), interpolation=cv2.INTER_AREA)
+              for index, frame in iter_frames(cap, step, strategy, total)}
+    seconds = time.perf_counter() - start
+    cap.release()
+    return seconds, frames, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="测试视频（默认生成合成视频）")
+    parser.add_argument("--width", type=int, default=3840)
+    parser.add_argument("--height", type=int, default=2160)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--fps", type=float, nargs="+", default=[2, 0.5, 0.1], help="目标抽帧帧率")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        video = args.video
+        if not video:
+            video = os.path.join(tmp, "bench.mp4")
+            print(f"生成合成视频 {args.width}x{args.height}，{args.seconds:.0f} 秒 ...")
+            make_video(video, args.width, args.height, args.seconds)
+
+        cap = cv2.VideoCapture(video)
+        source_fps = cap.get(cv2.CAP_PROP_FPS)
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        cap.release()
+
+        print(f"\n视频 {size[0]}x{size[1]} @ {source_fps:.1f} 帧/秒")
+        print(f"{'目标帧率':<8}{'间隔':>6}{'方式':>8}{'耗时(s)':>10}{'源帧/秒':>10}{'输出帧/秒':>11}{'输出帧':>8}{'与 read 一致':>14}")
+        for fps in args.fps:
+            step = frame_step(source_fps, fps)
+            baseline = None
+            for strategy in ("read", "grab", "seek"):
+                seconds, frames, total = run(video, step, strategy)
+                if baseline is None:
+                    baseline = frames
+                same = (frames.keys() == baseline.keys() and
+                        all(np.abs(frames[k].astype(int) - baseline[k]).mean() < 2 for k in frames))
+                mark = "*" if choose_strategy(step, total) == strategy else " "
+                print(f"{fps:<8g}{step:>6}{strategy + mark:>8}{seconds:>10.2f}{total / seconds:>10.0f}"
+                      f"{len(frames) / seconds:>11.1f}{len(frames):>8}{'是' if same else '否':>14}")
+        print("\n* 为 auto 的选择")
+
+
+if __name__ == "__main__":
+    main()
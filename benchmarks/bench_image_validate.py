@@ -0,0 +1,86 @@
+"""
+损坏 / 截断图片校验：判定正确性 + 进程池吞吐量（见 app/services/image_validate.py）
+
+用法（在仓库根目录）：
+    python -m benchmarks.bench_image_validate --count 400 --width 1920 --height 1080 --workers 1 2 4
+
+先生成一组样例文件并逐个核对 validate_image 的判定（正常 / 损坏），有误判时列出并以非零状态退出；
+样例包含 IEND / EOI 之后带附加数据的正常文件（不应判为损坏）与截断、乱码、空文件。
+再把同一组文件按 --workers 指定的进程数完整解码，输出耗时与图片/秒。
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from app.services.image_validate import VALIDATE_CHUNKSIZE, validate_image
+
+TRAILER = b"trailing-data" * 8
+
+
+def make_samples(folder, width, height):
+    """样例文件：[(文件名, 期望结果 True 正常 / False 损坏)]"""
+    rng = np.random.default_rng(0)
+    img = cv2.resize(rng.integers(0, 255, (height // 8, width // 8, 3), dtype=np.uint8), (width, height))
+    jpg = cv2.imencode(".jpg", img)[1].tobytes()
+    png = cv2.imencode(".png", img)[1].tobytes()
+    samples = {
+        "ok.jpg": (jpg, True),
+        "ok.png": (png, True),
+        "trailing.jpg": (jpg + TRAILER, True),
+        "trailing.png": (png + TRAILER, True),
+        "truncated.jpg": (jpg[:len(jpg) // 2], False),
+        "truncated.png": (png[:len(png) // 2], False),
+        "no_iend.png": (png[:-12], False),
+        "garbage.jpg": (rng.integers(0, 255, 4096, dtype=np.uint8).tobytes(), False),
+        "empty.png": (b"", False),
+    }
+    for name, (data, _) in samples.items():
+        with open(os.path.join(folder, name), "wb") as f:
+            f.write(data)
+    return [(name, expected) for name, (_, expected) in samples.items()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=400, help="吞吐量测试的文件数（循环使用样例文件）")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="校验进程数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        samples = make_samples(tmp, args.width, args.height)
+        wrong = []
+        print(f"{'样例':<16}{'期望':>6}{'结果':>6}")
+        for name, expected in samples:
+            ok = validate_image(os.path.join(tmp, name))
+            print(f"{name:<16}{'正常' if expected else '损坏':>6}{'正常' if ok else '损坏':>6}")
+            if ok != expected:
+                wrong.append(name)
+
+        paths = [os.path.join(tmp, samples[i % len(samples)][0]) for i in range(args.count)]
+        print(f"\n{len(paths)} 个文件，{args.width}x{args.height}，CPU 核数 {os.cpu_count()}")
+        print(f"{'进程数':<8}{'耗时(s)':>10}{'图片/秒':>10}")
+        for workers in args.workers:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                list(pool.map(validate_image, paths[:workers], chunksize=1))  # 预热：进程启动不计入
+                start = time.perf_counter()
+                list(pool.map(validate_image, paths, chunksize=VALIDATE_CHUNKSIZE))
+                seconds = time.perf_counter() - start
+            print(f"{workers:<8}{seconds:>10.2f}{len(paths) / seconds:>10.1f}")
+
+    if wrong:
+        print(f"\n误判：{', '.join(wrong)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+多边形点集存储对比：JSON 文本 vs float32 二进制（PointsField）
+
+用法（在仓库根目录）：
+    python -m benchmarks.bench_polygon_codec --vertices 10000 --shapes 100
+
+模拟一张含 --vertices 个顶点（平均分到 --shapes 个多边形）的图片，
+分别测量编码/解码耗时、整图保存/加载耗时以及数据库文件大小。
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.models.fields import encode_points, decode_points
+
+
+def make_shapes(vertices, shapes, seed=0):
+    rng = np.random.default_rng(seed)
+    per_shape = max(3, vertices // shapes)
+    return [rng.random((per_shape, 2), dtype=np.float64) for _ in range(shapes)]
+
+
+def bench(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def bench_db(shapes, repeat, tmp):
+    from app.models.schema import db, ALL_MODELS, Project, Label, Directory, MediaItem
+    from app.models.migrations import run_migrations
+
+    encoders = {
+        "json": lambda s: json.dumps(s.tolist()),
+        "blob": encode_points,
+    }
+    decoders = {
+        "json": lambda v: np.asarray(json.loads(v), dtype=np.float32),
+        "blob": decode_points,
+    }
+
+    results = {}
+    for mode in ("json", "blob"):
+        path = os.path.join(tmp, f"{mode}.db")
+        db.init(path)
+        Directory.clear_cache()
+        db.connect()
+        run_migrations(db, ALL_MODELS)
+        project = Project.create(name="bench", path=f"/bench/{mode}")
+        media = MediaItem.create(project=project, directory=Directory.intern(f"/bench/{mode}"), name="img.jpg")
+        label = Label.create(project=project, name="obj")
+        encode, decode = encoders[mode], decoders[mode]
+
+        # 与 save_annotations / load_annotations_from_db 相同的整图替换写入与读出（含编码/解码）
+        def save():
+            rows = [(media.id, label.id, encode(s)) for s in shapes]
+            with db.atomic():
+                db.execute_sql("DELETE FROM annotation WHERE media_item_id = ?", (media.id,))
+                db.cursor().executemany(
+                    "INSERT INTO annotation (media_item_id, label_id, x, y, w, h, shape_type, points, confidence, created_at, uid) "
+                    "VALUES (?, ?, 0, 0, 0, 0, 'poly', ?, 1.0, datetime('now'), lower(hex(randomblob(16))))", rows)
+
+        def load():
+            rows = db.execute_sql("SELECT points FROM annotation WHERE media_item_id = ?", (media.id,)).fetchall()
+            return [decode(r[0]) for r in rows]
+
+        save_ms = bench(save, repeat)
+        load_ms = bench(load, repeat)
+        db.execute_sql("VACUUM")
+        db.close()
+        results[mode] = (save_ms, load_ms, os.path.getsize(path))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vertices", type=int, default=10000)
+    parser.add_argument("--shapes", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    shapes = make_shapes(args.vertices, args.shapes)
+    texts = [json.dumps(s.tolist()) for s in shapes]
+    blobs = [encode_points(s) for s in shapes]
+
+    codec = [
+        ("编码", bench(lambda: [json.dumps(s.tolist()) for s in shapes], args.repeat),
+         bench(lambda: [encode_points(s) for s in shapes], args.repeat)),
+        ("解码", bench(lambda: [np.asarray(json.loads(t), dtype=np.float32) for t in texts], args.repeat),
+         bench(lambda: [decode_points(b) for b in blobs], args.repeat)),
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_results = bench_db(shapes, args.repeat, tmp)
+
+    print(f"\n单图 {args.shapes} 个多边形，共 {sum(len(s) for s in shapes)} 个顶点")
+    print(f"{'项目':<16}{'JSON':>14}{'float32':>14}{'加速':>10}")
+    for name, t_json, t_blob in codec:
+        print(f"{name + '(ms)':<16}{t_json:>14.3f}{t_blob:>14.3f}{t_json / t_blob:>9.1f}x")
+    (js, jl, jsize), (bs, bl, bsize) = db_results["json"], db_results["blob"]
+    print(f"{'整图保存(ms)':<16}{js:>14.3f}{bs:>14.3f}{js / bs:>9.1f}x")
+    print(f"{'整图加载(ms)':<16}{jl:>14.3f}{bl:>14.3f}{jl / bl:>9.1f}x")
+    print(f"{'点集字节数':<16}{sum(len(t) for t in texts):>14}{sum(len(b) for b in blobs):>14}")
+    print(f"{'数据库大小':<16}{jsize:>14}{bsize:>14}")
+
+
+if __name__ == "__main__":
+    main()
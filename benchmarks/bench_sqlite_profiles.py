@@ -0,0 +1,85 @@
+"""
+SQLite PRAGMA 配置对比：保存吞吐（saves/sec）与统计查询延迟
+
+用法（在仓库根目录）：
+    python -m benchmarks.bench_sqlite_profiles --media 20000 --saves 500
+
+对 config.SQLITE_PROFILES 中的每个配置，在临时目录新建数据库，
+导入模拟图片后反复调用 DataManager.save_annotations / get_all_projects_stats。
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from app.common.config import SQLITE_PROFILES, get_sqlite_pragmas
+from app.models.schema import db, ALL_MODELS, Project, Directory, MediaItem
+from app.models.migrations import run_migrations
+from app.services.data_manager import DataManager
+
+
+def populate(n_projects, n_media):
+    with db.atomic():
+        projects = [Project.create(name=f"project_{p}", path=f"/data/project_{p}") for p in range(n_projects)]
+        dirs = [Directory.intern(p.path) for p in projects]
+        rows = [{
+            'project': projects[i % n_projects],
+            'directory': dirs[i % n_projects],
+            'name': f"img_{i:08d}.jpg",
+            'media_type': 'image'
+        } for i in range(n_media)]
+        for i in range(0, len(rows), 500):
+            MediaItem.insert_many(rows[i:i + 500]).execute()
+    return [m.id for m in MediaItem.select(MediaItem.id)]
+
+
+def run_profile(profile, tmp, args):
+    db.init(os.path.join(tmp, f"{profile}.db"), pragmas=get_sqlite_pragmas(profile))
+    Directory.clear_cache()
+    db.connect()
+    run_migrations(db, ALL_MODELS)
+    media_ids = populate(args.projects, args.media)
+
+    rnd = random.Random(0)
+    boxes = [{"label": "person", "x": 0.5, "y": 0.5, "w": 0.2, "h": 0.3} for _ in range(args.boxes)]
+
+    start = time.perf_counter()
+    for _ in range(args.saves):
+        DataManager.save_annotations(rnd.choice(media_ids), boxes)
+    saves_per_sec = args.saves / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(args.stats):
+        DataManager.get_all_projects_stats()
+    stats_ms = (time.perf_counter() - start) / args.stats * 1000
+
+    journal = db.execute_sql("PRAGMA journal_mode").fetchone()[0]
+    db.close()
+    return saves_per_sec, stats_ms, journal
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--projects", type=int, default=4)
+    parser.add_argument("--media", type=int, default=20000)
+    parser.add_argument("--saves", type=int, default=500)
+    parser.add_argument("--boxes", type=int, default=5, help="每次保存的标注数")
+    parser.add_argument("--stats", type=int, default=20)
+    parser.add_argument("--profiles", nargs="*", default=list(SQLITE_PROFILES))
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in args.profiles:
+            results.append((profile, *run_profile(profile, tmp, args)))
+
+    print(f"\n模拟数据：{args.projects} 个项目 / {args.media} 张图片，每次保存 {args.boxes} 个标注")
+    print(f"{'profile':<12}{'journal':<10}{'saves/sec':>12}{'stats(ms)':>12}")
+    for profile, saves_per_sec, stats_ms, journal in results:
+        print(f"{profile:<12}{journal:<10}{saves_per_sec:>12.1f}{stats_ms:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
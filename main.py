@@ -1,12 +1,23 @@
 import sys
+import multiprocessing
 from PySide6.QtWidgets import QApplication
 from app.ui.main_window import MainWindow
 from app.models.schema import init_db
 
 if __name__ == '__main__':
+    # 打包后查重哈希的进程池子进程从这里进入，不再执行下面的启动流程
+    multiprocessing.freeze_support()
+
     # 1. 初始化数据库
     init_db()
 
+    # 修复命令：python main.py --rebuild-stats，按实际数据重建项目计数器后退出
+    if '--rebuild-stats' in sys.argv[1:]:
+        from app.services.data_manager import DataManager
+        count = DataManager.rebuild_stats()
+        print(f"已重建 {count} 个项目的计数器")
+        sys.exit(0)
+
     # 2. 启动应用
     app = QApplication(sys.argv)
     w = MainWindow()